@@ -0,0 +1,63 @@
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from .models import Attachment, Ticket, ticket_member
+
+
+class AccessControl:
+    """Answers whether a user may see or change tickets and attachments.
+
+    Every answer costs at most one EXISTS query and is remembered, so checking the same object again in the
+    request is free. Get the instance of a request with ``access_control(request)``.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.answers = {}
+
+    def check(self, key, decide):
+        if key not in self.answers:
+            self.answers[key] = decide()
+        return self.answers[key]
+
+    def can_view_ticket(self, ticket_id):
+        def decide():
+            tickets = Ticket.objects.filter(pk=ticket_id)
+            if not self.user.has_perm("ticketcontrol.unhide_ticket"):
+                tickets = tickets.filter(hidden=False)
+            return tickets.visible_to(self.user).exists()
+        return self.check(("view_ticket", ticket_id), decide)
+
+    def can_change_ticket(self, ticket_id):
+        def decide():
+            if self.user.has_perm("ticketcontrol.change_ticket"):
+                return True
+            return Ticket.objects.filter(pk=ticket_id, owner=self.user.id).exists()
+        return self.check(("change_ticket", ticket_id), decide)
+
+    def can_view_attachment(self, attachment_id):
+        def decide():
+            if self.user.has_perm("ticketcontrol.view_attachment"):
+                return True
+            user_id = self.user.id
+            # attachments of comments belong to the ticket of the comment
+            return Attachment.objects.filter(pk=attachment_id) \
+                .annotate(acl_ticket=Coalesce("ticket", "comment__ticket")) \
+                .filter(Q(user=user_id) | Q(comment__user=user_id) | ticket_member(user_id, "acl_ticket")) \
+                .exists()
+        return self.check(("view_attachment", attachment_id), decide)
+
+    def can_delete_attachment(self, attachment_id):
+        def decide():
+            if self.user.has_perm("ticketcontrol.delete_attachment"):
+                return True
+            user_id = self.user.id
+            return Attachment.objects.filter(Q(user=user_id) | Q(ticket__owner=user_id) | Q(comment__user=user_id),
+                                             pk=attachment_id).exists()
+        return self.check(("delete_attachment", attachment_id), decide)
+
+
+def access_control(request):
+    if not hasattr(request, "access_control"):
+        request.access_control = AccessControl(request.user)
+    return request.access_control
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class TicketcontrolConfig(AppConfig):
+    name = "ticketcontrol"
+
+    def ready(self):
+        # connect signal receivers
+        from . import autocomplete, backends, inbox, reference, search
@@ -0,0 +1,168 @@
+import bisect
+import heapq
+import itertools
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+USER_INDEX_VERSION_KEY = "user-index:version"
+MAX_RESULTS = 10
+GRAM_SIZE = 3
+INDEXED_FIELDS = {"username", "first_name", "last_name"}
+
+
+def user_index_version():
+    version = cache.get(USER_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(USER_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(USER_INDEX_VERSION_KEY)
+    return version
+
+
+def invalidate_user_index():
+    cache.set(USER_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class UserIndex:
+    """Prefix and infix lookup of users by username, first name and last name.
+
+    ``rows`` are (id, username, first_name, last_name) tuples. Prefix matches are found by bisecting the sorted
+    field values. Infix matches of longer queries come from the posting list of the rarest trigram of the query,
+    two character queries merge the posting lists of the trigrams starting with them and the first matches of
+    every single character are looked up while building.
+    """
+
+    def __init__(self, rows):
+        self.users = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        self.texts = []
+        self.values = []
+        self.offsets = []
+        postings = defaultdict(list)
+        offset = 0
+        for position, (user_id, *fields) in enumerate(self.users):
+            fields = [field.lower() for field in fields if field]
+            # fields are separated by a newline, no gram of a query spans two of them
+            text = "\n".join(fields) + "\n"
+            self.texts.append(text)
+            self.offsets.append(offset)
+            offset += len(text)
+            self.values.extend((field, position) for field in fields)
+            for gram in {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}:
+                postings[gram].append(position)
+        self.values.sort()
+        self.postings = dict(postings)
+        self.grams_by_prefix = defaultdict(list)
+        for gram in self.postings:
+            self.grams_by_prefix[gram[:2]].append(gram)
+        self.all_texts = "".join(self.texts)
+        self.char_matches = {char: list(itertools.islice(self._scan(char), 2 * MAX_RESULTS))
+                             for char in set(self.all_texts) - {"\n"}}
+
+    def _prefix_matches(self, query):
+        for i in range(bisect.bisect_left(self.values, (query,)), len(self.values)):
+            value, position = self.values[i]
+            if not value.startswith(query):
+                return
+            yield position
+
+    def _scan(self, query):
+        start = self.all_texts.find(query)
+        while start != -1:
+            position = bisect.bisect_right(self.offsets, start) - 1
+            yield position
+            start = self.all_texts.find(query, self.offsets[position] + len(self.texts[position]))
+
+    def _infix_matches(self, query):
+        if len(query) == 1:
+            yield from self.char_matches.get(query, ())
+            return
+        if len(query) == 2:
+            merged = heapq.merge(*(self.postings[gram] for gram in self.grams_by_prefix.get(query, ())))
+            for position, group in itertools.groupby(merged):
+                yield position
+            return
+        grams = {query[i:i + GRAM_SIZE] for i in range(len(query) - GRAM_SIZE + 1)}
+        candidates = min((self.postings.get(gram, ()) for gram in grams), key=len)
+        for position in candidates:
+            if query in self.texts[position]:
+                yield position
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Return up to ``limit`` (id, username, first_name, last_name) rows, prefix matches first."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        found = []
+        for matches in (self._prefix_matches(query), self._infix_matches(query)):
+            for position in matches:
+                if position not in found:
+                    found.append(position)
+                    if len(found) == limit:
+                        return [self.users[position] for position in found]
+        return [self.users[position] for position in found]
+
+
+class SharedUserIndex:
+    """The UserIndex of a worker, rebuilt when a user was changed in any worker.
+
+    The first lookup of a worker builds the index, later rebuilds run in a background thread and the previous
+    index answers until the new one is done.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.index = None
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    def _build(self, version):
+        self.index = UserIndex(User.objects.values_list("id", "username", "first_name", "last_name"))
+        self.version = version
+
+    def _rebuild(self, version):
+        try:
+            self._build(version)
+        except Exception:
+            logger.exception("Unable to rebuild the user index")
+        finally:
+            # the thread has its own database connection
+            connection.close()
+            self.rebuilding = False
+
+    def search(self, query, limit=MAX_RESULTS):
+        version = user_index_version()
+        if self.index is None:
+            self._build(version)
+        elif version != self.version:
+            with self.lock:
+                start = not self.rebuilding
+                self.rebuilding = True
+            if start:
+                threading.Thread(target=self._rebuild, args=(version,), daemon=True).start()
+        return self.index.search(query, limit)
+
+
+user_index = SharedUserIndex()
+
+
+@receiver(post_save, sender=User, dispatch_uid="user_index_user_saved")
+def user_saved(sender, update_fields=None, **kwargs):
+    # e.g. the last_login update on every login does not touch the index
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    # workers that rebuild before the commit would not see the change
+    transaction.on_commit(invalidate_user_index)
+
+
+@receiver(post_delete, sender=User, dispatch_uid="user_index_user_deleted")
+def user_deleted(sender, **kwargs):
+    transaction.on_commit(invalidate_user_index)
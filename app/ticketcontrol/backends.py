@@ -0,0 +1,98 @@
+import uuid
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import User
+
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+PERMISSION_VERSION_KEY = "permissions:version"
+
+
+def permission_version():
+    version = cache.get(PERMISSION_VERSION_KEY)
+    if version is None:
+        # a fresh random version can never match entries written before the version was lost
+        cache.add(PERMISSION_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(PERMISSION_VERSION_KEY)
+    return version
+
+
+def permission_cache_key(user_id, version=None):
+    return "permissions:" + str(version or permission_version()) + ":" + str(user_id)
+
+
+def invalidate_all_permissions():
+    cache.set(PERMISSION_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_user_permissions(user_ids):
+    version = permission_version()
+    cache.delete_many([permission_cache_key(user_id, version) for user_id in user_ids])
+
+
+class CachedPermissionBackend(ModelBackend):
+    """ModelBackend that keeps the permission set of a user in the shared cache between requests.
+
+    Entries are dropped when the user's groups or permissions change and all of them are dropped (by
+    changing the version in the key) when the permissions of a group change.
+
+    request.user is loaded as the ticketcontrol User in one query, views use it directly instead of loading
+    the subclass again.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = permission_cache_key(user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, PERMISSION_CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
+
+
+def _members_changed(instance, action, reverse, pk_set):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # user.groups / user.user_permissions changed
+        invalidate_user_permissions([instance.pk])
+    elif pk_set:
+        # group.user_set / permission.user_set changed
+        invalidate_user_permissions(pk_set)
+    else:
+        invalidate_all_permissions()
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="permissions_user_groups_changed")
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _members_changed(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through, dispatch_uid="permissions_user_permissions_changed")
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _members_changed(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through, dispatch_uid="permissions_group_permissions_changed")
+def group_permissions_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_all_permissions()
+
+
+@receiver(post_delete, sender=Group, dispatch_uid="permissions_group_deleted")
+def group_deleted(sender, **kwargs):
+    invalidate_all_permissions()
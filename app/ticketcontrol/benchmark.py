@@ -0,0 +1,355 @@
+import random
+import re
+import time
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, get_resolver
+
+from .autocomplete import UserIndex
+from .initial_data import load_initial_data
+from .models import (Attachment, Category, Comment, SearchIndexEntry, Ticket, TicketInbox, Upload, User,
+                     ghost_user_id)
+from .search import search_tickets, ticket_weights
+
+# Maximum number of queries a GET of the route may issue, for either benchmark user.
+# Routes missing here are reported but not checked.
+QUERY_BUDGETS = {
+    "": 4,
+    "attachment/<int:id>": 3,
+    "attachment/<int:id>/name/<str:name>": 3,
+    "attachment/upload/<uuid:id>": 3,
+    "category/<int:id>": 3,
+    "category/create": 1,
+    "category/manage": 1,
+    "group/<int:id>": 4,
+    "group/create": 1,
+    "group/manage": 1,
+    "imprint": 1,
+    "login/": 1,
+    "privacy": 1,
+    "register/": 1,
+    "register/activate": 2,
+    "settings": 1,
+    "ticket/<int:id>": 8,
+    "ticket/manage": 4,
+    "ticket/my": 4,
+    "ticket/new": 1,
+    "ticket/search": 5,
+    "user/<int:id>": 2,
+    "user/<int:id>/edit": 3,
+    "user/check_username/<str:username>": 1,
+    "user/create": 1,
+    "user/autocomplete": 1,
+    "user/manage": 2,
+    "user/passwordreset": 2,
+    "user/passwordreset/request": 1,
+    "user/profile": 3,
+}
+
+# Routes that would end the benchmark session
+SKIPPED_ROUTES = ("logout/",)
+
+# Routes that only change data on POST, a GET would only measure the error response
+POST_ROUTES = (
+    "attachment/<int:id>/delete", "attachment/upload", "attachment/upload/<uuid:id>/finalize",
+    "attachment/upload/init", "category/<int:id>/delete", "comment/<int:id>/edit", "group/<int:id>/delete",
+    "ticket/<int:id>/close", "ticket/<int:id>/comment/add", "ticket/<int:id>/delete", "ticket/<int:id>/edit",
+    "ticket/<int:id>/hide", "ticket/<int:id>/info/update/", "ticket/<int:id>/moderators/add/",
+    "ticket/<int:id>/moderators/add/<str:username>", "ticket/<int:id>/moderators/remove/<str:username>",
+    "ticket/<int:id>/participants/add/", "ticket/<int:id>/participants/add/<str:username>",
+    "ticket/<int:id>/participants/remove/<str:username>", "ticket/<int:id>/status/update", "ticket/<int:id>/unhide",
+    "user/<int:id>/delete",
+)
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+
+class Dataset:
+    def __init__(self, user, other_user, ticket, comment, attachment, group, category, uploads):
+        self.user = user
+        self.other_user = other_user
+        self.ticket = ticket
+        self.comment = comment
+        self.attachment = attachment
+        self.group = group
+        self.category = category
+        # unfinished upload per user id, every user only sees their own
+        self.uploads = uploads
+
+
+def seed_dataset(scale, seed=42):
+    """Fill an empty (test) database with ``scale`` sized synthetic data.
+
+    The benchmark user owns, participates in and moderates ``scale`` tickets each, and every ticket has
+    ``scale`` comments with one attachment each, so per-request query counts must not grow with ``scale``.
+    """
+    rand = random.Random(seed)
+    load_initial_data()
+    user_group = Group.objects.get(name="user")
+    group = Group.objects.create(name="benchmark")
+    categories = [Category.objects.create(name="Benchmark " + str(i)) for i in range(3)]
+    users = [User.add_user("bench" + str(i) + "@example.com", "Bench", "User " + str(i), "bench" + str(i),
+                           BENCHMARK_PASSWORD, [user_group.id, group.id], True, email_confirmed=True)
+             for i in range(scale * 5)]
+    user, other_user = users[0], users[1]
+
+    tickets = []
+    for i in range(scale * 10):
+        owner = user if i < scale else rand.choice(users[1:])
+        ticket = Ticket.add_ticket("Benchmark ticket " + str(i), "Synthetic ticket number " + str(i), owner,
+                                   rand.choice(categories), "Room " + str(i))
+        Attachment.objects.create(filename="ticket-" + str(i) + ".txt", size=1024, ticket=ticket, user=owner)
+        if scale <= i < scale * 2:
+            ticket.participating.add(user)
+        if scale * 2 <= i < scale * 3:
+            ticket.moderators.add(user)
+        ticket.participating.add(*rand.sample(users[1:], min(3, len(users) - 1)))
+        for j in range(scale):
+            author = rand.choice(users)
+            comment = ticket.add_comment("Synthetic comment " + str(j), author)
+            Attachment.objects.create(filename="comment-" + str(j) + ".txt", size=2048, comment=comment,
+                                      user=author)
+        tickets.append(ticket)
+
+    ticket = tickets[0]
+    comment = Comment.objects.filter(ticket=ticket).order_by("id").first()
+    attachment = Attachment.objects.filter(ticket=ticket).first()
+    uploads = {uploader.id: Upload.objects.create(filename="upload.txt", size=4096, chunk_size=1024, user=uploader,
+                                                  ticket=ticket)
+               for uploader in (user, User.objects.get(username="admin"))}
+    return Dataset(user, other_user, ticket, comment, attachment, group, categories[0], uploads)
+
+
+def route_patterns(patterns=None, prefix=""):
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLPattern):
+            if pattern.name and route not in SKIPPED_ROUTES and route not in POST_ROUTES:
+                yield route
+        elif not route.startswith("djangoadmin/"):
+            yield from route_patterns(pattern.url_patterns, route)
+
+
+def route_url(route, dataset, user):
+    ids = {
+        "ticket": dataset.ticket.id,
+        "comment": dataset.comment.id,
+        "attachment": dataset.attachment.id,
+        "user": dataset.user.id,
+        "group": dataset.group.id,
+        "category": dataset.category.id,
+    }
+    values = {
+        "username": dataset.other_user.username,
+        "name": dataset.attachment.filename,
+    }
+
+    def replace(match):
+        converter, name = match.groups()
+        if converter == "uuid":
+            return str(dataset.uploads[user.id].id)
+        if name == "id":
+            return str(ids[route.split("/")[0]])
+        return values[name]
+
+    url = "/" + re.sub(r"<(?:(\w+):)?(\w+)>", replace, route)
+    if route in ("register/activate", "user/passwordreset"):
+        url += "?user-id=" + str(dataset.user.id) + "&token=benchmark"
+    if route == "ticket/search":
+        # terms of every ticket, both are read from their postings before the ranking
+        url += "?q=synthetic+ticket"
+    if route == "user/autocomplete":
+        url += "?q=bench"
+    return url
+
+
+class Measurement:
+    def __init__(self, status, queries, sql_time, wall_time, joins=0):
+        self.status = status
+        self.queries = queries
+        self.sql_time = sql_time
+        self.wall_time = wall_time
+        self.joins = joins
+
+
+class QueryTimer:
+    """Execute wrapper counting the queries and their time, captured_queries only has whole milliseconds."""
+
+    def __init__(self):
+        self.queries = 0
+        self.joins = 0
+        self.sql_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.joins += sql.count(" JOIN ")
+
+
+def measure(client, url):
+    timer = QueryTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        response = client.get(url)
+        wall_time = time.perf_counter() - start
+    return Measurement(response.status_code, timer.queries, timer.sql_time, wall_time, timer.joins)
+
+
+def run_routes(dataset):
+    """Request every named route except POST_ROUTES as the benchmark user and as an admin.
+
+    Returns ``{(route, username): Measurement}``.
+    """
+    admin = User.objects.get(username="admin")
+    results = {}
+    for user in (dataset.user, admin):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        for route in route_patterns():
+            url = route_url(route, dataset, user)
+            # warm up per-process caches, the second request is the steady state
+            client.get(url)
+            results[(route, "admin" if user == admin else "user")] = measure(client, url)
+    return results
+
+
+def seed_user_history(size):
+    """Create a user that owns, moderates and participates in ``size`` tickets each and wrote ``size`` comments
+    with one attachment each."""
+    load_initial_data()
+    ghost_user_id.cache_clear()
+    category = Category.objects.first()
+    owner = User.objects.get(username="admin")
+    user = User.add_user("history@example.com", "History", "User", "history", BENCHMARK_PASSWORD,
+                         [Group.objects.get(name="user").id], True, email_confirmed=True)
+    for i in range(size):
+        own = Ticket.add_ticket("Own ticket " + str(i), "Synthetic ticket", user, category)
+        other = Ticket.add_ticket("Other ticket " + str(i), "Synthetic ticket", owner, category)
+        other.moderators.add(user)
+        other.participating.add(user)
+        comment = own.add_comment("Synthetic comment " + str(i), user)
+        Attachment.objects.create(filename="comment-" + str(i) + ".txt", size=2048, comment=comment, user=user)
+    return user
+
+
+def measure_user_deletion(size):
+    user = seed_user_history(size)
+    # the ghost id is looked up once per process, not per deletion
+    ghost_user_id()
+    timer = QueryTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        user.delete()
+        wall_time = time.perf_counter() - start
+    return Measurement(None, timer.queries, timer.sql_time, wall_time)
+
+
+AUTOCOMPLETE_NAMES = ["anna", "ben", "clara", "david", "emil", "frieda", "georg", "hanna", "ida", "jonas", "karl",
+                      "lena", "max", "nora", "otto", "paula", "rosa", "simon", "theo", "ute", "valentin", "wilma"]
+
+
+def autocomplete_rows(size):
+    rng = random.Random(size)
+    rows = []
+    for i in range(size):
+        first_name = rng.choice(AUTOCOMPLETE_NAMES).capitalize()
+        last_name = rng.choice(AUTOCOMPLETE_NAMES).capitalize() + rng.choice(["mann", "er", "berg", "hof", ""])
+        rows.append((i + 1, first_name[0].lower() + "." + last_name.lower() + str(i), first_name, last_name))
+    return rows
+
+
+def measure_autocomplete(size, queries):
+    """Build a UserIndex of ``size`` synthetic users and time the first lookup of every query of ``queries``.
+
+    Returns the build time and ``{query: (results, seconds)}``.
+    """
+    rows = autocomplete_rows(size)
+    start = time.perf_counter()
+    index = UserIndex(rows)
+    build_time = time.perf_counter() - start
+    timings = {}
+    for query in queries:
+        start = time.perf_counter()
+        results = index.search(query)
+        timings[query] = (len(results), time.perf_counter() - start)
+    return build_time, timings
+
+
+MEMBER_TICKET_INTERVAL = 10
+SEARCH_WORDS = ["drucker", "netzwerk", "raum", "beamer", "passwort", "laptop", "monitor", "software", "update",
+                "zugang", "kabel", "telefon", "server", "backup", "lizenz", "tastatur", "wlan", "vpn", "mail", "scanner"]
+
+
+def seed_search_tickets(tickets, comments, batch_size=1000, seed=42):
+    """Bulk create ``tickets`` tickets with ``comments`` comments each and their search index entries.
+
+    Every title contains "ticket", the other words are picked with falling frequency, "drucker" most often.
+    Returns a user without view_ticket who participates in every MEMBER_TICKET_INTERVAL-th ticket.
+    """
+    rand = random.Random(seed)
+    load_initial_data()
+    owner = User.objects.get(username="admin")
+    member = User.objects.create_user("benchmark-member", "member@benchmark.invalid", "benchmark")
+    category = Category.objects.first()
+    frequencies = [1 / rank for rank in range(1, len(SEARCH_WORDS) + 1)]
+
+    def text(length):
+        return " ".join(rand.choices(SEARCH_WORDS, frequencies, k=length))
+
+    last_id = 0
+    for start in range(0, tickets, batch_size):
+        # bulk_create skips the signals, the index entries are written below
+        Ticket.objects.bulk_create([
+            Ticket(title="Ticket " + text(3), description=text(20), location="Raum " + str(i), owner=owner,
+                   category=category, comment_count=comments)
+            for i in range(start, min(start + batch_size, tickets))
+        ])
+        batch = list(Ticket.objects.filter(id__gt=last_id).order_by("id"))
+        last_id = batch[-1].id
+        Comment.objects.bulk_create([
+            Comment(content=text(10), ticket=ticket, user=owner, num=num)
+            for ticket in batch for num in range(1, comments + 1)
+        ], batch_size=batch_size)
+        contents = {}
+        for ticket_id, content in Comment.objects.filter(ticket__in=batch).values_list("ticket_id", "content"):
+            contents.setdefault(ticket_id, []).append(content)
+        entries = []
+        for ticket in batch:
+            weights = ticket_weights(ticket.title, ticket.description, ticket.location, contents.get(ticket.id, []))
+            entries += [SearchIndexEntry(term=term, weight=weight, ticket_id=ticket.id)
+                        for term, weight in weights.items()]
+        SearchIndexEntry.objects.bulk_create(entries, batch_size=batch_size)
+        member_tickets = batch[::MEMBER_TICKET_INTERVAL]
+        Ticket.participating.through.objects.bulk_create([
+            Ticket.participating.through(ticket_id=ticket.id, user_id=member.id) for ticket in member_tickets
+        ])
+        TicketInbox.objects.bulk_create([
+            TicketInbox(user=member, ticket=ticket, role=TicketInbox.RoleChoices.PARTICIPANT, status=ticket.status,
+                        hidden=ticket.hidden)
+            for ticket in member_tickets
+        ])
+    return member
+
+
+def measure_search(queries, user):
+    """Run every query of ``queries`` like the search view does for ``user``.
+
+    Returns ``{query: (results, Measurement)}``.
+    """
+    timings = {}
+    for query in queries:
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            results = search_tickets(query, user)
+            wall_time = time.perf_counter() - start
+        timings[query] = (len(results), Measurement(None, timer.queries, timer.sql_time, wall_time))
+    return timings
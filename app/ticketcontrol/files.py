@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+
+from .models import Attachment, Blob, FileRemoval
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+PARTIAL_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "partial")
+BLOB_DIR = "blobs"
+BLOCK_SIZE = 64 * 1024
+
+
+class IncompleteChunk(Exception):
+    pass
+
+
+def upload_path(attachment_id):
+    # attachments uploaded before the blob store, see the convert_uploads_to_blobs command
+    return os.path.join(UPLOAD_DIR, str(attachment_id))
+
+
+def blob_name(content_hash):
+    """Path of a blob relative to UPLOAD_DIR."""
+    return os.path.join(BLOB_DIR, content_hash[:2], content_hash)
+
+
+def blob_path(content_hash):
+    return os.path.join(UPLOAD_DIR, blob_name(content_hash))
+
+
+def attachment_name(attachment):
+    """Path of the file of an attachment relative to UPLOAD_DIR."""
+    if attachment.blob_id is None:
+        return str(attachment.id)
+    return blob_name(attachment.blob.hash)
+
+
+def partial_upload_path(upload_id):
+    return os.path.join(PARTIAL_UPLOAD_DIR, str(upload_id))
+
+
+def content_hash(chunk_digests):
+    """Content hash of a file from the sha256 hex digests of its UPLOAD_CHUNK_SIZE sized chunks.
+
+    Hashing the chunk digests instead of the whole file lets a chunked upload be hashed one request at a time.
+    """
+    return hashlib.sha256(bytes.fromhex("".join(chunk_digests))).hexdigest()
+
+
+def write_chunk(path, offset, stream, length):
+    """Copy ``length`` bytes from ``stream`` into the file at ``offset`` and return their sha256 hex digest.
+
+    The chunk is never held in memory as a whole. Raises IncompleteChunk when the stream ends early.
+    """
+    digest = hashlib.sha256()
+    with open(path, "r+b") as destination:
+        destination.seek(offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IncompleteChunk()
+            destination.write(block)
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def attachment_url(attachment, user_id):
+    """Download URL of an attachment for the given user.
+
+    With ATTACHMENT_URL_SECRET set this is a link to /signed_attachment that nginx serves by itself after checking
+    the signature with secure_link, see proxy/default.conf.tpl. The signature covers the file, the user and the
+    expiry. Expiry times are rounded so that pages rendered shortly after each other link the same URL and browsers
+    can reuse their cached copy.
+    """
+    if not settings.ATTACHMENT_URL_SECRET:
+        return reverse("attachment", kwargs={"id": attachment.id, "name": attachment.filename})
+    lifetime = settings.ATTACHMENT_URL_LIFETIME
+    expires = (int(time.time()) // lifetime + 2) * lifetime
+    name = attachment_name(attachment)
+    # must match secure_link_md5 in proxy/default.conf.tpl
+    signed = str(expires) + "/signed_attachment/" + name + str(user_id) + " " + settings.ATTACHMENT_URL_SECRET
+    signature = base64.urlsafe_b64encode(hashlib.md5(signed.encode()).digest()).decode().rstrip("=")
+    return "/signed_attachment/" + name + "?" + urlencode({"user": user_id, "expires": expires, "md5": signature,
+                                                           "name": attachment.filename}, quote_via=quote)
+
+
+def file_content_hash(path):
+    chunk_digests = []
+    with open(path, "rb") as source:
+        while chunk := source.read(settings.UPLOAD_CHUNK_SIZE):
+            chunk_digests.append(hashlib.sha256(chunk).hexdigest())
+    return content_hash(chunk_digests)
+
+
+def save_uploaded_file(file, path):
+    """Write a Django UploadedFile to ``path`` and return its content hash."""
+    chunk_digests = []
+    file.seek(0)
+    with open(path, "wb+") as destination:
+        # not file.chunks(), in memory uploads ignore its chunk size
+        while chunk := file.read(settings.UPLOAD_CHUNK_SIZE):
+            destination.write(chunk)
+            chunk_digests.append(hashlib.sha256(chunk).hexdigest())
+    return content_hash(chunk_digests)
+
+
+def add_blob_reference(content_hash, size, path):
+    """Store the file at ``path`` under its content hash and return its Blob with one more reference.
+
+    If the content is already stored the file at ``path`` is removed instead. Call this in the transaction that
+    creates the attachment.
+    """
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(hash=content_hash, defaults={"size": size})
+        destination = blob_path(content_hash)
+        # a removal queued when the blob lost its last reference must not delete the content stored again.
+        # Waits for a running remove_scheduled_files that already locked the entry.
+        FileRemoval.objects.filter(path=destination).delete()
+        if os.path.exists(destination):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(path, destination)
+        Blob.objects.filter(id=blob.id).update(reference_count=F("reference_count") + 1)
+    return blob
+
+
+def release_blobs(blob_ids):
+    """Drop one reference per entry of ``blob_ids`` and queue the files of unreferenced blobs for removal.
+
+    Call this in the transaction that deletes the attachments.
+    """
+    references = Counter(blob_id for blob_id in blob_ids if blob_id is not None)
+    if not references:
+        return
+    by_count = {}
+    for blob_id, count in references.items():
+        by_count.setdefault(count, []).append(blob_id)
+    for count, ids in by_count.items():
+        Blob.objects.filter(id__in=ids).update(reference_count=F("reference_count") - count)
+    unreferenced = Blob.objects.filter(id__in=references.keys(), reference_count=0)
+    schedule_removal([blob_path(content_hash) for content_hash in unreferenced.values_list("hash", flat=True)])
+    unreferenced.delete()
+
+
+def delete_attachments(attachments):
+    """Delete the attachments of a queryset and release their files. Call this in a transaction."""
+    files = list(attachments.values_list("id", "blob_id"))
+    Attachment.objects.filter(id__in=[attachment_id for attachment_id, blob_id in files]).delete()
+    release_blobs([blob_id for attachment_id, blob_id in files])
+    schedule_removal([upload_path(attachment_id) for attachment_id, blob_id in files if blob_id is None])
+    return len(files)
+
+
+def schedule_removal(paths):
+    """Queue files for removal by remove_scheduled_files.
+
+    Call this in the transaction that deletes the rows referencing the files, they are only removed once it
+    committed.
+    """
+    FileRemoval.objects.bulk_create([FileRemoval(path=path) for path in paths], batch_size=1000)
+
+
+def remove_scheduled_files(batch_size=500):
+    """Unlink queued files in batches, returns the number of removed entries.
+
+    Files that cannot be removed stay queued and are retried on the next run.
+    """
+    removed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # the lock keeps add_blob_reference from storing a blob again while its old file is removed
+            batch = list(FileRemoval.objects.select_for_update().filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not batch:
+                return removed
+            done = []
+            for entry in batch:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.exception("Unable to remove " + entry.path)
+                    continue
+                done.append(entry.id)
+            FileRemoval.objects.filter(id__in=done).delete()
+        removed += len(done)
+        last_id = batch[-1].id
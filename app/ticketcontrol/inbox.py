@@ -0,0 +1,111 @@
+from django.db.models import Q, prefetch_related_objects
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .models import Ticket, TicketInbox
+
+OWNER = TicketInbox.RoleChoices.OWNER
+PARTICIPANT = TicketInbox.RoleChoices.PARTICIPANT
+MODERATOR = TicketInbox.RoleChoices.MODERATOR
+
+
+@receiver(post_save, sender=Ticket, dispatch_uid="inbox_ticket_saved")
+def ticket_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if not created:
+        TicketInbox.objects.filter(ticket=instance).update(status=instance.status, hidden=instance.hidden)
+        owners = TicketInbox.objects.filter(ticket=instance, role=OWNER)
+        if owners.filter(user=instance.owner_id).exists():
+            return
+        # the ticket was handed over to another user (e.g. the ghost user)
+        owners.delete()
+    TicketInbox.objects.create(user_id=instance.owner_id, ticket=instance, role=OWNER,
+                               status=instance.status, hidden=instance.hidden)
+
+
+def _membership_changed(role, instance, action, reverse, pk_set):
+    if action == "pre_clear":
+        if reverse:
+            TicketInbox.objects.filter(user=instance, role=role).delete()
+        else:
+            TicketInbox.objects.filter(ticket=instance, role=role).delete()
+        return
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+
+    # reverse means the relation was changed from the user side (user.participating.add(ticket))
+    if reverse:
+        pairs = [(instance.pk, ticket_id) for ticket_id in pk_set]
+    else:
+        pairs = [(user_id, instance.pk) for user_id in pk_set]
+
+    if action == "post_remove":
+        match = Q()
+        for user_id, ticket_id in pairs:
+            match |= Q(user_id=user_id, ticket_id=ticket_id)
+        TicketInbox.objects.filter(match, role=role).delete()
+    else:
+        if reverse:
+            states = {ticket["id"]: (ticket["status"], ticket["hidden"])
+                      for ticket in Ticket.objects.filter(id__in=pk_set).values("id", "status", "hidden")}
+        else:
+            states = {instance.pk: (instance.status, instance.hidden)}
+        TicketInbox.objects.bulk_create([
+            TicketInbox(user_id=user_id, ticket_id=ticket_id, role=role,
+                        status=states[ticket_id][0], hidden=states[ticket_id][1])
+            for user_id, ticket_id in pairs
+        ], ignore_conflicts=True)
+
+
+@receiver(m2m_changed, sender=Ticket.participating.through, dispatch_uid="inbox_participants_changed")
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _membership_changed(PARTICIPANT, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Ticket.moderators.through, dispatch_uid="inbox_moderators_changed")
+def moderators_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _membership_changed(MODERATOR, instance, action, reverse, pk_set)
+
+
+def open_inbox(user_id):
+    return TicketInbox.objects.filter(user=user_id, hidden=False, status__in=Ticket.OPEN_STATUSES)
+
+
+def user_tickets(user_id):
+    """Return the open tickets of a user grouped by role ("own", "part", "mod").
+
+    One range scan on the inbox replaces the separate owner / participating / moderators queries. A ticket
+    the user owns is only listed as "own", participants that also moderate are listed in both "part" and "mod".
+    """
+    roles = {}
+    tickets = {}
+    for entry in open_inbox(user_id).select_related("ticket__owner", "ticket__category").order_by("ticket_id"):
+        roles.setdefault(entry.ticket_id, set()).add(entry.role)
+        tickets[entry.ticket_id] = entry.ticket
+    prefetch_related_objects(list(tickets.values()), "participating", "moderators")
+
+    grouped = {"own": [], "part": [], "mod": []}
+    for ticket_id, ticket_roles in roles.items():
+        ticket = tickets[ticket_id]
+        if OWNER in ticket_roles:
+            grouped["own"].append(ticket)
+            continue
+        if PARTICIPANT in ticket_roles:
+            grouped["part"].append(ticket)
+        if MODERATOR in ticket_roles:
+            grouped["mod"].append(ticket)
+    return grouped
+
+
+def tickets_by_role(user_id):
+    """Return the ids of the open tickets of a user per role, read from the tickets instead of the inbox.
+
+    Groups like user_tickets, check_ticket_inbox compares both.
+    """
+    tickets = Ticket.objects.open()
+    return {
+        "own": set(tickets.owned_by(user_id).values_list("id", flat=True)),
+        "part": set(tickets.participated_by(user_id).values_list("id", flat=True)),
+        "mod": set(tickets.moderated_by(user_id).values_list("id", flat=True)),
+    }
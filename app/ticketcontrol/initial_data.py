@@ -1,6 +1,7 @@
 from django.contrib.auth.models import Permission as BasePermission, Group
 from django.contrib.contenttypes.models import ContentType
 from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 
 from .models import *
 
@@ -102,9 +103,10 @@ def load_categories():
 
 
 def load_initial_data():
-    table_names = connection.introspection.table_names()
-    if "ticketcontrol_permission" in table_names and "auth_group" in table_names and "ticketcontrol_user" in table_names \
-            and "ticketcontrol_category" in table_names and "ticketcontrol_ticket" in table_names:
+    # the models only match the tables once every migration is applied, e.g. migrate imports the urls before it
+    # migrates
+    executor = MigrationExecutor(connection)
+    if not executor.migration_plan(executor.loader.graph.leaf_nodes()):
         load_permissions()
         load_groups()
         load_admin_user()
@@ -0,0 +1,61 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from ticketcontrol.benchmark import QUERY_BUDGETS, run_routes, seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway test database at two sizes, request every route except the POST only ones and " \
+           "check the query budgets. Fails when a route fails, exceeds its budget or issues more queries on the " \
+           "larger dataset."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--small", type=int, default=2, help="scale of the small dataset")
+        parser.add_argument("--large", type=int, default=6, help="scale of the large dataset")
+
+    def run_at_scale(self, scale):
+        # password hashing would dominate seeding and is not what is measured here.
+        # The test database gets its own cache, ids in there mean something else than in the real database.
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+                               CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                                   "LOCATION": "benchmark-" + str(scale)}}):
+            call_command("flush", interactive=False, verbosity=0)
+            dataset = seed_dataset(scale)
+            return run_routes(dataset)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            small = self.run_at_scale(options["small"])
+            large = self.run_at_scale(options["large"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        failures = []
+        self.stdout.write("%-55s %-5s %6s %8s %8s %6s %9s %9s" % (
+            "route", "user", "status", "queries", "(small)", "joins", "sql ms", "wall ms"))
+        for key, result in sorted(large.items()):
+            route, user = key
+            self.stdout.write("%-55s %-5s %6d %8d %8d %6d %9.2f %9.2f" % (
+                "/" + route, user, result.status, result.queries, small[key].queries, result.joins,
+                result.sql_time * 1000, result.wall_time * 1000))
+            for scale, measurement in ((options["small"], small[key]), (options["large"], result)):
+                # a crashing route stops early and would pass its budget
+                if measurement.status >= 500:
+                    failures.append("%s (%s): status %d at scale %d" % (route, user, measurement.status, scale))
+            if result.queries > small[key].queries:
+                failures.append("%s (%s): %d queries at scale %d, %d at scale %d" % (
+                    route, user, small[key].queries, options["small"], result.queries, options["large"]))
+            budget = QUERY_BUDGETS.get(route)
+            if budget is not None and result.queries > budget:
+                failures.append("%s (%s): %d queries, budget is %d" % (route, user, result.queries, budget))
+
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(failure))
+        if failures:
+            raise CommandError(str(len(failures)) + " query budget violations or failed routes")
+        self.stdout.write(self.style.SUCCESS("All routes within their query budgets"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ticketcontrol.benchmark import measure_autocomplete
+
+DEFAULT_QUERIES = ["a", "ma", "max", "berg", "ute", "nnaho", "a.wil", "x", "zz", "zzz", "q", "yz", "999", "t.otto12"]
+
+
+class Command(BaseCommand):
+    help = "Time user autocomplete lookups on an index of synthetic users. " \
+           "Fails when a lookup takes longer than --max-ms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--max-ms", type=float, default=1)
+
+    def handle(self, *args, **options):
+        build_time, timings = measure_autocomplete(options["users"], options["queries"])
+        self.stdout.write("Built the index of %d users in %.0f ms" % (options["users"], build_time * 1000))
+        self.stdout.write("%12s %8s %9s" % ("query", "results", "ms"))
+        for query, (results, seconds) in timings.items():
+            self.stdout.write("%12s %8d %9.3f" % (query, results, seconds * 1000))
+        failures = [query for query, (results, seconds) in timings.items() if seconds * 1000 > options["max_ms"]]
+        if failures:
+            raise CommandError("Slower than " + str(options["max_ms"]) + " ms: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All lookups took less than " + str(options["max_ms"]) + " ms"))
@@ -0,0 +1,47 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from ticketcontrol.benchmark import measure_search, seed_search_tickets
+from ticketcontrol.models import User
+
+DEFAULT_QUERIES = ["ticket", "drucker", "drucker netzwerk", "ticket drucker raum", "vpn scanner", "kaffeemaschine"]
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway test database with tickets and comments and time ranked searches as an admin and " \
+           "as a user who only sees the tickets they participate in. Fails when a search takes longer than --max-ms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+        parser.add_argument("--tickets", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=10, help="comments per ticket")
+        parser.add_argument("--max-ms", type=float, default=100)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                                       "LOCATION": "benchmark-search"}}):
+                call_command("flush", interactive=False, verbosity=0)
+                member = seed_search_tickets(options["tickets"], options["comments"])
+                timings = {}
+                for user in (User.objects.get(username="admin"), member):
+                    for query, result in measure_search(options["queries"], user).items():
+                        timings[(user.username, query)] = result
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write("%d tickets with %d comments each" % (options["tickets"], options["comments"]))
+        self.stdout.write("%-17s %24s %8s %8s %9s %9s" % ("user", "query", "results", "queries", "sql ms", "wall ms"))
+        for (username, query), (results, result) in timings.items():
+            self.stdout.write("%-17s %24s %8d %8d %9.2f %9.2f" % (username, query, results, result.queries,
+                                                                  result.sql_time * 1000, result.wall_time * 1000))
+        failures = [username + ": " + query for (username, query), (results, result) in timings.items()
+                    if result.wall_time * 1000 > options["max_ms"]]
+        if failures:
+            raise CommandError("Slower than " + str(options["max_ms"]) + " ms: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All searches took less than " + str(options["max_ms"]) + " ms"))
@@ -0,0 +1,41 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from ticketcontrol.benchmark import measure_user_deletion
+
+
+class Command(BaseCommand):
+    help = "Delete users with a growing history in a throwaway test database. " \
+           "Fails when deleting a user with a longer history issues more queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("sizes", nargs="*", type=int, default=[10, 100, 1000],
+                            help="number of tickets, moderated tickets and comments of the deleted user")
+
+    def measure(self, size):
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+                               CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                                   "LOCATION": "benchmark-user-delete-" + str(size)}}):
+            call_command("flush", interactive=False, verbosity=0)
+            return measure_user_deletion(size)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = [(size, self.measure(size)) for size in sorted(options["sizes"])]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write("%8s %8s %9s %9s" % ("history", "queries", "sql ms", "wall ms"))
+        for size, result in results:
+            self.stdout.write("%8d %8d %9.2f %9.2f" % (size, result.queries, result.sql_time * 1000,
+                                                        result.wall_time * 1000))
+        smallest = results[0][1]
+        failures = [size for size, result in results if result.queries > smallest.queries]
+        if failures:
+            raise CommandError("More queries for larger histories: " + ", ".join(str(size) for size in failures))
+        self.stdout.write(self.style.SUCCESS("User deletion issues a constant number of queries"))
@@ -0,0 +1,72 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ticketcontrol.inbox import open_inbox
+from ticketcontrol.models import Ticket, User
+from ticketcontrol.views import TICKETS_PER_PAGE
+
+
+def ticket_querysets(user):
+    # the query shapes issued by dashboard_view, mytickets_view and ticket_manage_view
+    visible = Ticket.objects.listed_for(user)
+    return {
+        "dashboard/my: inbox": open_inbox(user.id).select_related("ticket__owner", "ticket__category"),
+        "manage: first page": visible.order_by("-creation_date", "-pk")[:TICKETS_PER_PAGE + 1],
+        "manage: visible, first page": visible.filter(hidden=False).order_by(
+            "-creation_date", "-pk")[:TICKETS_PER_PAGE + 1],
+        "manage: by status": visible.filter(hidden=False, status=Ticket.StatusChoices.OPEN).order_by(
+            "-creation_date", "-pk")[:TICKETS_PER_PAGE + 1],
+    }
+
+
+def _mysql_full_scans(plan):
+    if isinstance(plan, dict):
+        tables = [plan.get("table_name")] if plan.get("access_type") == "ALL" else []
+        children = plan.values()
+    elif isinstance(plan, list):
+        tables, children = [], plan
+    else:
+        return []
+    for child in children:
+        tables += _mysql_full_scans(child)
+    return tables
+
+
+def full_table_scans(queryset):
+    if connection.vendor == "mysql":
+        return _mysql_full_scans(json.loads(queryset.explain(format="json")))
+    plan = queryset.explain()
+    if connection.vendor == "sqlite":
+        # "SCAN <table>" without "USING ... INDEX" reads every row
+        return [match.group(1) for match in re.finditer(r"\bSCAN (\w+)\b(?! USING)", plan)]
+    if connection.vendor == "postgresql":
+        return re.findall(r"Seq Scan on (\w+)", plan)
+    raise CommandError("Query plan checks are not supported for " + connection.vendor)
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the ticket list queries and fail if any of them needs a full table scan. " \
+           "Run it against a database with realistic data, small tables are often scanned on purpose."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default="admin", help="username the queries are built for")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError("User " + options["user"] + " does not exist")
+
+        failed = []
+        for name, queryset in ticket_querysets(user).items():
+            tables = full_table_scans(queryset)
+            if tables:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(name + ": full table scan on " + ", ".join(tables)))
+            else:
+                self.stdout.write(self.style.SUCCESS(name + ": ok"))
+        if failed:
+            raise CommandError(str(len(failed)) + " queries fall back to a full table scan")
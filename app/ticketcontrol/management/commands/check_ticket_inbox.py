@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ticketcontrol.inbox import tickets_by_role, user_tickets
+from ticketcontrol.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare the open tickets of the dashboard inbox with the ticket owners, participants and moderators. " \
+           "Fails when the inbox of any user is out of date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="only check this username")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+            if not users.exists():
+                raise CommandError("User " + options["user"] + " does not exist")
+
+        failed = []
+        for user_id, username in users.values_list("id", "username").iterator():
+            inbox = {role: {ticket.id for ticket in tickets} for role, tickets in user_tickets(user_id).items()}
+            expected = tickets_by_role(user_id)
+            for role in expected:
+                missing = sorted(expected[role] - inbox[role])
+                extra = sorted(inbox[role] - expected[role])
+                if missing or extra:
+                    failed.append(username)
+                    self.stdout.write(self.style.ERROR(username + " " + role + ": missing " + str(missing) +
+                                                       ", not expected " + str(extra)))
+        if failed:
+            raise CommandError(str(len(set(failed))) + " users have an outdated inbox")
+        self.stdout.write(self.style.SUCCESS("All inboxes match the tickets"))
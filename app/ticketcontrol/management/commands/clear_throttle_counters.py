@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.throttle import DatabaseStore
+
+
+class Command(BaseCommand):
+    help = "Delete the expired login and password reset counters of the DatabaseStore"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = DatabaseStore.clear_expired(options["batch_size"])
+        self.stdout.write("Deleted " + str(removed) + " expired counters")
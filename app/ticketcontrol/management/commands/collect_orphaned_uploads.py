@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ticketcontrol.orphans import (collect_attachments_without_files, collect_files_without_rows,
+                                   collect_stale_uploads, collect_unlinked_attachments)
+
+
+class Command(BaseCommand):
+    help = "Remove attachments that were never linked to a ticket or comment, abandoned uploads and files " \
+           "without rows. Files are queued for remove_scheduled_files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=24,
+                            help="hours after which unlinked attachments, uploads and files are orphans")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--delete-missing", action="store_true",
+                            help="also delete attachments whose file is missing (only reported by default)")
+
+    def handle(self, *args, **options):
+        ttl = timedelta(hours=options["ttl"])
+        batch_size = options["batch_size"]
+        before = timezone.now() - ttl
+
+        count = collect_unlinked_attachments(before, batch_size)
+        self.stdout.write("Unlinked attachments: " + str(count))
+        count = collect_stale_uploads(before, batch_size)
+        self.stdout.write("Abandoned uploads: " + str(count))
+        count = collect_files_without_rows(time.time() - ttl.total_seconds(), batch_size)
+        self.stdout.write("Files without rows: " + str(count))
+        count = collect_attachments_without_files(options["delete_missing"], batch_size)
+        if options["delete_missing"]:
+            self.stdout.write("Deleted attachments without files: " + str(count))
+        else:
+            self.stdout.write("Attachments without files: " + str(count))
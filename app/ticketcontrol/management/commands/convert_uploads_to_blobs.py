@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ticketcontrol.files import add_blob_reference, file_content_hash, upload_path
+from ticketcontrol.models import Attachment
+
+
+class Command(BaseCommand):
+    help = "Move attachments stored as uploads/<id> into the deduplicated blob store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        converted = 0
+        missing = 0
+        last_id = 0
+        while True:
+            batch = list(Attachment.objects.filter(blob=None, id__gt=last_id).order_by("id")[:options["batch_size"]])
+            if not batch:
+                break
+            for attachment in batch:
+                path = upload_path(attachment.id)
+                if not os.path.isfile(path):
+                    missing += 1
+                    continue
+                file_hash = file_content_hash(path)
+                with transaction.atomic():
+                    attachment.blob = add_blob_reference(file_hash, os.path.getsize(path), path)
+                    attachment.save()
+                converted += 1
+            last_id = batch[-1].id
+        self.stdout.write("Converted " + str(converted) + " attachments, " + str(missing) + " files are missing")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.models import Ticket
+from ticketcontrol.search import index_ticket
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ticket search index from all tickets and comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = 0
+        last_id = 0
+        while True:
+            ids = list(Ticket.objects.filter(id__gt=last_id).order_by("id")
+                       .values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            for ticket_id in ids:
+                index_ticket(ticket_id)
+            last_id = ids[-1]
+            count += len(ids)
+        self.stdout.write("Ticket: indexed " + str(count))
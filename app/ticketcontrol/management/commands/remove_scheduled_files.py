@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.files import remove_scheduled_files
+
+
+class Command(BaseCommand):
+    help = "Remove the upload files of deleted tickets and users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        removed = remove_scheduled_files(options["batch_size"])
+        self.stdout.write("Removed " + str(removed) + " files")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.notifications import send_notification_digests
+
+
+class Command(BaseCommand):
+    help = "Queue one digest mail per member for the ticket activity of the last NOTIFICATION_DIGEST_WINDOW"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        queued = send_notification_digests(batch_size=options["batch_size"])
+        self.stdout.write("Queued " + str(queued) + " digests")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.outbox import run_outbox_worker, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send the queued emails over one SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--forever", action="store_true",
+                            help="keep running and look for due mails every --interval seconds")
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        if options["forever"]:
+            run_outbox_worker(options["interval"], options["batch_size"])
+        sent = send_queued_emails(options["batch_size"])
+        self.stdout.write("Sent " + str(sent) + " emails")
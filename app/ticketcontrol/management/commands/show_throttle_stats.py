@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ticketcontrol.throttle import rejected_counts
+
+
+class Command(BaseCommand):
+    help = "Show how many login and password reset requests were rejected by the throttle"
+
+    def handle(self, *args, **options):
+        for name, count in rejected_counts().items():
+            self.stdout.write(name + ": " + str(count) + " rejected")
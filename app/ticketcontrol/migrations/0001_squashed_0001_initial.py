@@ -0,0 +1,104 @@
+import django.contrib.auth.models
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.migrations.state import ModelState, ProjectState
+
+
+def create_auth_user_table(apps, schema_editor):
+    # auth does not create auth_user since ticketcontrol.User replaced auth.User, the user model is based on it
+    # until 0031_flatten_user
+    if "auth_user" in schema_editor.connection.introspection.table_names():
+        return
+    state = ProjectState()
+    for model in ("contenttypes.ContentType", "auth.Permission", "auth.Group", "auth.User"):
+        model_state = ModelState.from_model(apps.get_model(model))
+        model_state.options.pop("swappable", None)
+        state.add_model(model_state)
+    schema_editor.create_model(state.apps.get_model("auth", "User"))
+
+
+class Migration(migrations.Migration):
+    # 0001_initial as it was applied, with auth.User as AUTH_USER_MODEL. 0001_initial refers to the setting and
+    # can no longer be loaded since ticketcontrol.User replaced auth.User. Databases that applied it use this
+    # migration in its place, fresh databases run it.
+    replaces = [('ticketcontrol', '0001_initial')]
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_auth_user_table, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('color', models.CharField(max_length=8)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('user_ptr',
+                 models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True,
+                                      primary_key=True, serialize=False, to='auth.user')),
+                ('role', models.CharField(choices=[('usr', 'User'), ('mod', 'Mod'), ('adm', 'Admin')], default='usr',
+                                          max_length=3)),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+            bases=('auth.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Ticket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(
+                    choices=[('uas', 'Unassigned'), ('ass', 'Assigned'), ('clo', 'Closed'), ('opn', 'Open'),
+                             ('wat', 'Waiting')], default='uas', max_length=3)),
+                ('creationDate', models.DateTimeField(auto_now_add=True)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('category',
+                 models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='ticketcontrol.category')),
+                ('moderator', models.ManyToManyField(related_name='moderator', to='ticketcontrol.user')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='owner',
+                                            to='ticketcontrol.user')),
+                ('participating', models.ManyToManyField(to='ticketcontrol.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField()),
+                ('creationDate', models.DateTimeField(auto_now_add=True)),
+                ('num', models.IntegerField()),
+                (
+                'ticket', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='ticketcontrol.ticket')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Attachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.IntegerField()),
+                ('creationDate', models.DateTimeField(auto_now_add=True)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                                              to='ticketcontrol.comment')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                                             to='ticketcontrol.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='ticketcontrol.user')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0020_category_groups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['owner', 'hidden', 'status'], name='ticket_owner_hidden_status'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['hidden', 'status', 'creation_date'], name='ticket_hidden_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['hidden', 'creation_date'], name='ticket_hidden_date'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['creation_date'], name='ticket_date'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0021_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ticketcontrol.comment')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ticketcontrol.ticket')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['term', 'ticket'], name='search_term_ticket'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_inbox(apps, schema_editor):
+    Ticket = apps.get_model("ticketcontrol", "Ticket")
+    TicketInbox = apps.get_model("ticketcontrol", "TicketInbox")
+    states = {}
+    entries = []
+    for ticket in Ticket.objects.values("id", "owner_id", "status", "hidden").iterator():
+        states[ticket["id"]] = (ticket["status"], ticket["hidden"])
+        entries.append(TicketInbox(user_id=ticket["owner_id"], ticket_id=ticket["id"], role="Owner",
+                                   status=ticket["status"], hidden=ticket["hidden"]))
+    for role, through in (("Participant", Ticket.participating.through), ("Moderator", Ticket.moderators.through)):
+        for member in through.objects.values("user_id", "ticket_id").iterator():
+            status, hidden = states[member["ticket_id"]]
+            entries.append(TicketInbox(user_id=member["user_id"], ticket_id=member["ticket_id"], role=role,
+                                       status=status, hidden=hidden))
+    TicketInbox.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0022_searchindexentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('Owner', 'Owner'), ('Participant', 'Participant'), ('Moderator', 'Moderator')], max_length=15)),
+                ('status', models.CharField(choices=[('Unassigned', 'Unassigned'), ('Assigned', 'Assigned'), ('Closed', 'Closed'), ('Open', 'Open'), ('Waiting', 'Waiting')], max_length=15)),
+                ('hidden', models.BooleanField(default=False)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox', to='ticketcontrol.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox', to='ticketcontrol.user')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticketinbox',
+            index=models.Index(fields=['user', 'hidden', 'status'], name='inbox_user_hidden_status'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticketinbox',
+            constraint=models.UniqueConstraint(fields=('user', 'ticket', 'role'), name='inbox_user_ticket_role'),
+        ),
+        migrations.RunPython(fill_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0023_ticketinbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemSetting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=32, unique=True)),
+                ('value', models.JSONField()),
+                ('version', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+def number_comments(apps, schema_editor):
+    # add_comment numbered almost every comment 1, renumber them in creation order
+    Ticket = apps.get_model("ticketcontrol", "Ticket")
+    Comment = apps.get_model("ticketcontrol", "Comment")
+    counts = {}
+    comments = []
+    for comment in Comment.objects.only("id", "ticket_id", "num").order_by("ticket_id", "id").iterator():
+        counts[comment.ticket_id] = counts.get(comment.ticket_id, 0) + 1
+        comment.num = counts[comment.ticket_id]
+        comments.append(comment)
+    Comment.objects.bulk_update(comments, ["num"], batch_size=1000)
+    tickets = [Ticket(id=ticket_id, comment_count=count) for ticket_id, count in counts.items()]
+    Ticket.objects.bulk_update(tickets, ["comment_count"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0024_systemsetting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(number_comments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='comment',
+            constraint=models.UniqueConstraint(fields=('ticket', 'num'), name='comment_ticket_num'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0025_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileRemoval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0026_fileremoval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.IntegerField()),
+                ('offset', models.IntegerField(default=0)),
+                ('chunk_size', models.IntegerField()),
+                ('chunk_digests', models.TextField(blank=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('last_update', models.DateTimeField(auto_now=True)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ticketcontrol.comment')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ticketcontrol.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ticketcontrol.user')),
+            ],
+        ),
+    ]
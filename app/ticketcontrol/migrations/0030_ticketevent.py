@@ -0,0 +1,25 @@
+# Generated by Django 4.0.10 on 2026-10-18 15:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0029_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('Comment', 'Comment'), ('Status', 'Status'), ('Moderator', 'Moderator'), ('Participant', 'Participant')], max_length=15)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='ticketcontrol.user')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ticketcontrol.ticket')),
+            ],
+        ),
+    ]
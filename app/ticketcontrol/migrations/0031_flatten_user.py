@@ -0,0 +1,110 @@
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.migrations.state import ModelState, ProjectState
+
+FLAG_FIELDS = {
+    "new_email": models.EmailField(blank=True, default=""),
+    "email_confirmed": models.BooleanField(default=False),
+    "reset_password": models.BooleanField(default=False),
+}
+
+
+def auth_user_model(apps, extra_fields):
+    """auth.User of ``apps`` with ``extra_fields``, rendered as if it was not replaced by ticketcontrol.User."""
+    state = ProjectState()
+    for model in ("contenttypes.ContentType", "auth.Permission", "auth.Group", "auth.User"):
+        model_state = ModelState.from_model(apps.get_model(model))
+        model_state.options.pop("swappable", None)
+        state.add_model(model_state)
+    state.models["auth", "user"].fields.update((name, field.clone()) for name, field in extra_fields.items())
+    return state.apps.get_model("auth", "User")
+
+
+def flatten_users(apps, schema_editor):
+    """Move the ticketcontrol_user columns into auth_user and point every user foreign key at auth_user.
+
+    ticketcontrol_user.user_ptr_id is the id of the auth_user row, so ids and foreign key values stay the same.
+    """
+    user = apps.get_model("ticketcontrol", "User")
+    quote = schema_editor.quote_name
+
+    added = {}
+    for name, field in FLAG_FIELDS.items():
+        base_user = auth_user_model(apps, added)
+        field = field.clone()
+        field.set_attributes_from_name(name)
+        schema_editor.add_field(base_user, field)
+        added[name] = field
+    schema_editor.execute(
+        "UPDATE auth_user SET " + ", ".join(
+            quote(name) + " = (SELECT u." + quote(name) + " FROM ticketcontrol_user u WHERE u.user_ptr_id = auth_user.id)"
+            for name in FLAG_FIELDS
+        ) + " WHERE id IN (SELECT user_ptr_id FROM ticketcontrol_user)"
+    )
+
+    base_user = auth_user_model(apps, added)
+    for model in apps.get_models(include_auto_created=True):
+        if model is user:
+            continue
+        for old_field in model._meta.local_fields:
+            if old_field.remote_field is None or old_field.remote_field.model is not user:
+                continue
+            new_field = old_field.clone()
+            new_field.remote_field.model = base_user
+            new_field.remote_field.field_name = base_user._meta.pk.name
+            new_field.set_attributes_from_name(old_field.name)
+            new_field.model = model
+            schema_editor.alter_field(model, old_field, new_field)
+
+    schema_editor.delete_model(user)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin', '0003_logentry_add_action_flag_choices'),
+        ('ticketcontrol', '0030_ticketevent'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(flatten_users),
+            ],
+            state_operations=[
+                migrations.DeleteModel(
+                    name='User',
+                ),
+                migrations.CreateModel(
+                    name='User',
+                    fields=[
+                        ('password', models.CharField(max_length=128, verbose_name='password')),
+                        ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                        ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                        ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                        ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                        ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                        ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                        ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                        ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                        ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('new_email', models.EmailField(blank=True, max_length=254)),
+                        ('email_confirmed', models.BooleanField(default=False)),
+                        ('reset_password', models.BooleanField(default=False)),
+                        ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                        ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+                    ],
+                    options={
+                        'db_table': 'auth_user',
+                        'permissions': (('change_user_permission', 'Change the permissions of other users'), ('admin_general', 'Allow access to the Admin Panel')),
+                    },
+                    managers=[
+                        ('objects', django.contrib.auth.models.UserManager()),
+                    ],
+                ),
+            ],
+        ),
+    ]
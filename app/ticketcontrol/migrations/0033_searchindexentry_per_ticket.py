@@ -0,0 +1,44 @@
+# Generated by Django 4.0.10 on 2026-10-18 16:16
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def merge_entries(apps, schema_editor):
+    # the entries of a ticket and of its comments become one entry per term and ticket
+    SearchIndexEntry = apps.get_model("ticketcontrol", "SearchIndexEntry")
+    Ticket = apps.get_model("ticketcontrol", "Ticket")
+    last_id = 0
+    while True:
+        ids = list(Ticket.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:500])
+        if not ids:
+            break
+        entries = [SearchIndexEntry(term=row["term"], weight=row["weight"], ticket_id=row["ticket_id"])
+                   for row in SearchIndexEntry.objects.filter(ticket_id__in=ids).values("term", "ticket_id")
+                   .annotate(weight=Sum("weight")).order_by()]
+        SearchIndexEntry.objects.filter(ticket_id__in=ids).delete()
+        SearchIndexEntry.objects.bulk_create(entries, batch_size=1000)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0032_throttlecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_entries, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='searchindexentry',
+            name='search_term_ticket',
+        ),
+        migrations.RemoveField(
+            model_name='searchindexentry',
+            name='comment',
+        ),
+        migrations.AddConstraint(
+            model_name='searchindexentry',
+            constraint=models.UniqueConstraint(fields=('term', 'ticket'), name='search_term_ticket_unique'),
+        ),
+    ]
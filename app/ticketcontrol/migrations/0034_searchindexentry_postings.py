@@ -0,0 +1,32 @@
+# Generated by Django 4.0.10 on 2026-10-18 16:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0033_searchindexentry_per_ticket'),
+    ]
+
+    operations = [
+        # created first, MySQL needs an index on ticket_id for the foreign key once its own index is dropped
+        migrations.AddConstraint(
+            model_name='searchindexentry',
+            constraint=models.UniqueConstraint(fields=('ticket', 'term'), name='search_ticket_term_unique'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='searchindexentry',
+            name='search_term_ticket_unique',
+        ),
+        migrations.AlterField(
+            model_name='searchindexentry',
+            name='ticket',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ticketcontrol.ticket'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['term', 'weight'], name='search_term_weight'),
+        ),
+    ]
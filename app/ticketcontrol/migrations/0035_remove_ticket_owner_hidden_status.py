@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-18 16:38
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketcontrol', '0034_searchindexentry_postings'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_owner_hidden_status',
+        ),
+    ]
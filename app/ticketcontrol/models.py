@@ -1,17 +1,15 @@
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import Permission as BasePermission
-from django.contrib.auth.models import User as BaseUser
+from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from six import text_type
-from django.db import models
+from django.db import models, transaction
 from django.contrib.sites.shortcuts import get_current_site
 from django.template.loader import render_to_string
-from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Max
-import os
-
-from .settings import EMAIL_HOST_USER
+from django.db.models import Exists, F, OuterRef, Q
+import functools
+import uuid
 
 
 class AccountActivationToken(PasswordResetTokenGenerator):
@@ -34,13 +32,17 @@ account_activation_token = AccountActivationToken()
 password_reset_token = PasswordResetToken()
 
 
-class User(BaseUser):
+class User(AbstractUser):
     class Meta:
+        # the table of auth.User, which this model replaced, see migration 0031_flatten_user
+        db_table = "auth_user"
         permissions = (
             ("change_user_permission", "Change the permissions of other users"),
             ("admin_general", "Allow access to the Admin Panel"),
         )
 
+    # auth_user.id is no BigAutoField
+    id = models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")
     new_email = models.EmailField(blank=True)
     email_confirmed = models.BooleanField(default=False)
     reset_password = models.BooleanField(default=False)
@@ -57,7 +59,7 @@ class User(BaseUser):
                 Group.objects.get(id=group).user_set.add(user)
             user.is_superuser = False
             user.is_staff = False
-            adminId = Group.objects.get(name="Admin").id
+            adminId = Group.objects.get(name="admin").id
             for groupId in groups:
                 if int(groupId) == adminId:
                     user.is_superuser = True
@@ -112,64 +114,50 @@ class User(BaseUser):
         self.save()
 
     def send_emailverification_mail(self, request, new_user=True):
+        from . import system_settings
+        from .outbox import enqueue_mail
         message = render_to_string("email/activate_mail.html", {
             'user': self,
             'domain': get_current_site(request).domain,
             'token': account_activation_token.make_token(self),
-            'half_page': settings.CONTENT["half_page"],
-            'contact_email': settings.GENERAL["contact_email"]
+            'half_page': system_settings.content()["half_page"],
+            'contact_email': system_settings.general()["contact_email"]
         })
         if new_user:
             subject = "Welcome to Ticketcontrol"
         else:
             subject = "[Ticketcontrol] Confirm your EMail address"
-        send_mail(
-            subject=subject,
-            message="",
-            html_message=message,
-            from_email=EMAIL_HOST_USER,
-            recipient_list=[self.new_email],
-            fail_silently=False
-        )
+        enqueue_mail(subject, message, [self.new_email])
 
     def send_passwordreset_mail(self, request):
+        from . import system_settings
+        from .outbox import enqueue_mail
         message = render_to_string("email/passwordreset_mail.html", {
             'user': self,
             'domain': get_current_site(request).domain,
             'token': password_reset_token.make_token(self),
-            'half_page': settings.CONTENT["half_page"],
-            'contact_email': settings.GENERAL["contact_email"]
+            'half_page': system_settings.content()["half_page"],
+            'contact_email': system_settings.general()["contact_email"]
         })
-        send_mail(
-            subject="[Ticketcontrol] Reset your password",
-            message="",
-            html_message=message,
-            from_email=EMAIL_HOST_USER,
-            recipient_list=[self.email],
-            fail_silently=False
-        )
+        enqueue_mail("[Ticketcontrol] Reset your password", message, [self.email])
 
     def delete(self):
-        ghost = User.objects.get(username="ghost")
-        tickets = self.tickets.all()
-        for ticket in tickets:
-            ticket.owner = ghost
-            ticket.save()
-        mod_tickets = Ticket.objects.filter(moderators=self.id)
-        for ticket in mod_tickets:
-            for mod in ticket.moderators.all():
-                if mod.id == self.id:
-                    ticket.moderators.remove(mod)
-                    ticket.save()
-        comments = self.comment_set.all()
-        for comment in comments:
-            comment.user = ghost
-            comment.save()
-        attachments = self.attachment_set.all()
-        for attachment in attachments:
-            attachment.user = ghost
-            attachment.save()
-        super().delete()
+        ghost_id = ghost_user_id()
+        with transaction.atomic():
+            TicketInbox.objects.filter(user=self.id, role=TicketInbox.RoleChoices.OWNER).update(user=ghost_id)
+            Ticket.objects.filter(owner=self.id).update(owner=ghost_id)
+            Comment.objects.filter(user=self.id).update(user=ghost_id)
+            Attachment.objects.filter(user=self.id).update(user=ghost_id)
+            TicketEvent.objects.filter(actor=self.id).update(actor=ghost_id)
+            Ticket.moderators.through.objects.filter(user=self.id).delete()
+            super().delete()
+
+
+@functools.lru_cache(maxsize=None)
+def ghost_user_id():
+    """Id of the user that takes over the tickets, comments and attachments of deleted users."""
+    return User.objects.values_list("id", flat=True).get(username="ghost")
+
 
 class Permission(models.Model):
     perm = models.OneToOneField(BasePermission, on_delete=models.DO_NOTHING)
@@ -187,16 +175,65 @@ class Category(models.Model):
 
 
 class Comment(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ticket", "num"], name="comment_ticket_num"),
+        ]
+
     content = models.TextField()
     creation_date = models.DateTimeField(auto_now_add=True)
     num = models.IntegerField()
     ticket = models.ForeignKey("Ticket", on_delete=models.DO_NOTHING)
     user = models.ForeignKey("User", on_delete=models.DO_NOTHING)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        comment = super().from_db(db, field_names, values)
+        # like Ticket.from_db, for the search index
+        comment._loaded_values = dict(zip(field_names, values))
+        return comment
+
     def __str__(self):
         return self.ticket.title + " Comment " + str(self.num)
 
 
+def ticket_member(user_id, ticket="pk"):
+    """Condition that the user owns, participates in or moderates the ticket whose id is the field ``ticket``.
+
+    Uses EXISTS subqueries instead of joining the member tables, so matching rows are never duplicated.
+    """
+    return Q(Exists(Ticket.objects.filter(pk=OuterRef(ticket), owner=user_id))) \
+        | Q(Exists(Ticket.participating.through.objects.filter(ticket=OuterRef(ticket), user=user_id))) \
+        | Q(Exists(Ticket.moderators.through.objects.filter(ticket=OuterRef(ticket), user=user_id)))
+
+
+class TicketQuerySet(models.QuerySet):
+    # Filters are written as equality / IN lists (never NOT) so they line up with the indexes in Ticket.Meta
+    def open(self):
+        return self.filter(hidden=False, status__in=Ticket.OPEN_STATUSES)
+
+    def owned_by(self, user_id):
+        return self.filter(owner=user_id)
+
+    def participated_by(self, user_id):
+        return self.filter(participating=user_id).exclude(owner=user_id)
+
+    def moderated_by(self, user_id):
+        return self.filter(moderators=user_id).exclude(owner=user_id)
+
+    def visible_to(self, user):
+        if user.has_perm("ticketcontrol.view_ticket"):
+            return self
+        return self.filter(ticket_member(user.id))
+
+    def listed_for(self, user):
+        # same tickets as visible_to, but read from the inbox rows of the user so a ticket list only touches the
+        # memberships of that user, the covering (user, ticket, role) index answers the subquery
+        if user.has_perm("ticketcontrol.view_ticket"):
+            return self
+        return self.filter(id__in=TicketInbox.objects.filter(user=user.id).values("ticket_id"))
+
+
 class Ticket(models.Model):
     class Meta:
         permissions = (
@@ -205,6 +242,15 @@ class Ticket(models.Model):
             ("change_ticket_status", "Change Ticket status"),
             ("assign_ticket", "Assign Ticket to users"),
         )
+        indexes = [
+            # manage page filtered by status, ordered by date
+            models.Index(fields=["hidden", "status", "creation_date"], name="ticket_hidden_status_date"),
+            # manage page without status filter, ordered by date
+            models.Index(fields=["hidden", "creation_date"], name="ticket_hidden_date"),
+            models.Index(fields=["creation_date"], name="ticket_date"),
+        ]
+
+    objects = TicketQuerySet.as_manager()
     class StatusChoices(models.TextChoices):
         UNASSIGNED = 'Unassigned'
         ASSIGNED = 'Assigned'
@@ -212,44 +258,57 @@ class Ticket(models.Model):
         OPEN = 'Open'
         WAITING = 'Waiting'
 
+    OPEN_STATUSES = [StatusChoices.UNASSIGNED, StatusChoices.ASSIGNED, StatusChoices.OPEN, StatusChoices.WAITING]
+
     def add_ticket(title:str, description:str, owner, category, location=None):
         ticket = Ticket(title=title, description=description, owner=owner, category=category, status='Unassigned', location=location)
         ticket.save()
         return ticket
 
     def add_comment(self, content, user):
-        comment = Comment(content=content, ticket=self, user=user)
-        try:
-            comment.num = int(Comment.objects.get(ticket=self).aggregate(Max('num'))) + 1
-        except:
-            comment.num = 1
-
-        comment.save()
+        with transaction.atomic():
+            # the update locks the ticket row until the comment is inserted, concurrent comments wait for it
+            tickets = Ticket.objects.filter(pk=self.pk)
+            tickets.update(comment_count=F("comment_count") + 1)
+            self.comment_count = tickets.values_list("comment_count", flat=True).get()
+            comment = Comment.objects.create(content=content, ticket=self, user=user, num=self.comment_count)
+            TicketEvent.objects.create(ticket=self, kind=TicketEvent.KindChoices.COMMENT, actor=user,
+                                       detail=content[:255])
         return comment
 
-    def set_status(self, status):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # the values as loaded, the search index skips saves that did not change the indexed text
+        ticket._loaded_values = dict(zip(field_names, values))
+        return ticket
+
+    def save(self, *args, **kwargs):
+        # comment_count is only changed by add_comment, never write back a possibly outdated value
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != "comment_count"]
+        super().save(*args, **kwargs)
+
+    def set_status(self, status, user_id=None):
+        changed = self.status != status
         self.status = status
-        self.save()
+        with transaction.atomic():
+            self.save(update_fields=["status"])
+            if changed:
+                TicketEvent.objects.create(ticket=self, kind=TicketEvent.KindChoices.STATUS, actor_id=user_id,
+                                           detail=status)
 
     def set_hidden(self, hidden):
         self.hidden = hidden
-        self.save()
+        self.save(update_fields=["hidden"])
 
     def delete(self):
-        comments = Comment.objects.filter(ticket=self.id)
-        for comment in comments:
-            attachments = Attachment.objects.filter(comment=comment.id)
-            for attachment in attachments:
-                os.remove("uploads/" + str(attachment.id))
-                attachment.delete()
-            comment.delete()
-
-        attachments = Attachment.objects.filter(ticket=self.id)
-        for attachment in attachments:
-            os.remove("uploads/" + str(attachment.id))
-            attachment.delete()
-
-        super().delete()
+        from .files import delete_attachments
+        with transaction.atomic():
+            delete_attachments(Attachment.objects.filter(Q(ticket=self) | Q(comment__ticket=self)))
+            Comment.objects.filter(ticket=self).delete()
+            super().delete()
 
     status = models.CharField(max_length=15, choices=StatusChoices.choices, default=StatusChoices.UNASSIGNED)
     creation_date = models.DateTimeField(auto_now_add=True)
@@ -261,11 +320,35 @@ class Ticket(models.Model):
     moderators = models.ManyToManyField("User", related_name="moderating", blank=True)
     hidden = models.BooleanField(default=False)
     location = models.CharField(max_length=255, null=True, blank=True)
+    comment_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title + " (" + self.owner.username + ")"
 
 
+class TicketInbox(models.Model):
+    # denormalized copy of the ticket memberships for dashboard_view and mytickets_view,
+    # maintained by ticketcontrol.inbox
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ticket", "role"], name="inbox_user_ticket_role"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "hidden", "status"], name="inbox_user_hidden_status"),
+        ]
+
+    class RoleChoices(models.TextChoices):
+        OWNER = 'Owner'
+        PARTICIPANT = 'Participant'
+        MODERATOR = 'Moderator'
+
+    user = models.ForeignKey(User, related_name="inbox", on_delete=models.CASCADE)
+    ticket = models.ForeignKey(Ticket, related_name="inbox", on_delete=models.CASCADE)
+    role = models.CharField(max_length=15, choices=RoleChoices.choices)
+    status = models.CharField(max_length=15, choices=Ticket.StatusChoices.choices)
+    hidden = models.BooleanField(default=False)
+
+
 class Attachment(models.Model):
     filename = models.CharField(max_length=255)
     size = models.IntegerField()
@@ -273,6 +356,7 @@ class Attachment(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.DO_NOTHING, null=True, blank=True)
     comment = models.ForeignKey(Comment, on_delete=models.DO_NOTHING, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=False, blank=False)
+    blob = models.ForeignKey("Blob", on_delete=models.PROTECT, null=True, blank=True)
 
     def __str__(self):
         size_unit = "B"
@@ -283,3 +367,98 @@ class Attachment(models.Model):
                 size = int(size / 1024)
 
         return self.filename + " (size: " + str(size) + size_unit + ")"
+
+
+class Blob(models.Model):
+    # content addressed attachment file, shared by all attachments with the same content, see files.py
+    hash = models.CharField(max_length=64, unique=True)
+    size = models.IntegerField()
+    reference_count = models.PositiveIntegerField(default=0)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash + " (" + str(self.reference_count) + " references)"
+
+
+class Upload(models.Model):
+    # a resumable attachment upload, the data is written to files.partial_upload_path(id) until it is finalized
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.IntegerField()
+    offset = models.IntegerField(default=0)
+    chunk_size = models.IntegerField()
+    chunk_digests = models.TextField(blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    ticket = models.ForeignKey(Ticket, on_delete=models.SET_NULL, null=True, blank=True)
+    comment = models.ForeignKey(Comment, on_delete=models.SET_NULL, null=True, blank=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
+    last_update = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.filename + " (" + str(self.offset) + "/" + str(self.size) + ")"
+
+
+class SearchIndexEntry(models.Model):
+    # one row per (term, ticket), the weight includes the comments of the ticket, maintained by ticketcontrol.search
+    class Meta:
+        constraints = [
+            # also the index of the ticket foreign key, and of the candidates of a search
+            models.UniqueConstraint(fields=["ticket", "term"], name="search_ticket_term_unique"),
+        ]
+        indexes = [
+            # the postings of a term, heaviest first
+            models.Index(fields=["term", "weight"], name="search_term_weight"),
+        ]
+
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, db_index=False)
+
+
+class FileRemoval(models.Model):
+    # upload files to unlink once the rows referencing them are gone, processed by remove_scheduled_files
+    path = models.CharField(max_length=255, db_index=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+
+class SystemSetting(models.Model):
+    section = models.CharField(max_length=32, unique=True)
+    value = models.JSONField()
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return self.section
+
+
+class OutgoingEmail(models.Model):
+    # sent and deleted by send_queued_emails, next_attempt is None once all attempts failed
+    subject = models.CharField(max_length=255)
+    html_message = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(null=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+
+class ThrottleCounter(models.Model):
+    # hits counted by ticketcontrol.throttle.DatabaseStore, the rejected request totals never expire
+    key = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires = models.DateTimeField(null=True, db_index=True)
+
+
+class TicketEvent(models.Model):
+    # pending ticket activity, merged into one digest per member and deleted by send_notification_digests
+    class KindChoices(models.TextChoices):
+        COMMENT = 'Comment'
+        STATUS = 'Status'
+        MODERATOR = 'Moderator'
+        PARTICIPANT = 'Participant'
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=15, choices=KindChoices.choices)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True)
+    detail = models.CharField(max_length=255, blank=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
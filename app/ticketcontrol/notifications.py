@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import system_settings
+from .models import TicketEvent, TicketInbox, User
+from .outbox import enqueue_mails
+
+
+def _recipients(ticket_ids):
+    """Map the ticket ids to the ids of their owner, participants and moderators that can receive mails."""
+    memberships = TicketInbox.objects.filter(ticket__in=ticket_ids, hidden=False) \
+        .values_list("ticket_id", "user_id").distinct()
+    members = {}
+    for ticket_id, user_id in memberships:
+        members.setdefault(ticket_id, set()).add(user_id)
+    user_ids = set().union(*members.values()) if members else set()
+    users = User.objects.filter(id__in=user_ids, is_active=True, email_confirmed=True).exclude(email="") \
+        .only("id", "username", "first_name", "email")
+    return members, {user.id: user for user in users}
+
+
+def send_notification_digests(window=None, batch_size=5000):
+    """Merge the pending ticket events into one digest per recipient and queue them for send_queued_emails.
+
+    Nothing is sent until the oldest pending event is ``window`` old, everything that happened on the
+    recipient's tickets until then ends up in the same mail. Members are not notified of their own actions,
+    events of hidden tickets are dropped. Returns the number of queued digests.
+
+    The events are read and rendered without locks, only queuing the mails and deleting the events is one short
+    transaction. New events can be recorded in the meantime.
+    """
+    if window is None:
+        window = timedelta(seconds=settings.NOTIFICATION_DIGEST_WINDOW)
+    events = list(TicketEvent.objects.select_related("ticket", "actor").order_by("id")[:batch_size])
+    if not events or events[0].creation_date > timezone.now() - window:
+        return 0
+    members, users = _recipients({event.ticket_id for event in events})
+
+    digests = {}
+    for event in events:
+        for user_id in members.get(event.ticket_id, ()):
+            if user_id == event.actor_id or user_id not in users:
+                continue
+            digests.setdefault(user_id, {}).setdefault(event.ticket_id, (event.ticket, []))[1].append(event)
+
+    context = {
+        "domain": settings.SITE_DOMAIN,
+        "half_page": system_settings.content()["half_page"],
+        "contact_email": system_settings.general()["contact_email"],
+    }
+    mails = []
+    for user_id, tickets in digests.items():
+        user = users[user_id]
+        message = render_to_string("email/ticket_digest.html",
+                                   dict(context, user=user, tickets=list(tickets.values())))
+        if len(tickets) == 1:
+            subject = "[Ticketcontrol] " + next(iter(tickets.values()))[0].title
+        else:
+            subject = "[Ticketcontrol] Activity on " + str(len(tickets)) + " tickets"
+        mails.append((subject[:255], message, user.email))
+
+    ids = [event.id for event in events]
+    with transaction.atomic():
+        # locks only these rows by primary key
+        pending = TicketEvent.objects.select_for_update().filter(id__in=ids).values_list("id", flat=True)
+        if len(pending) != len(ids):
+            # a concurrent run already queued some of them, the rest is picked up by the next run
+            return 0
+        enqueue_mails(mails)
+        TicketEvent.objects.filter(id__in=ids).delete()
+    return len(mails)
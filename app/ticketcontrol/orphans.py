@@ -0,0 +1,123 @@
+import os
+import re
+import uuid
+
+from django.db import transaction
+
+from .files import (BLOB_DIR, PARTIAL_UPLOAD_DIR, UPLOAD_DIR, attachment_name, delete_attachments,
+                    partial_upload_path, schedule_removal)
+from .models import Attachment, Blob, FileRemoval, Upload
+
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+def collect_unlinked_attachments(before, batch_size=500):
+    """Delete attachments that were uploaded before ``before`` but never linked to a ticket or comment."""
+    removed = 0
+    last_id = 0
+    while True:
+        ids = list(Attachment.objects.filter(ticket=None, comment=None, creation_date__lt=before, id__gt=last_id)
+                   .order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return removed
+        with transaction.atomic():
+            # only the rows of the batch are locked, an attachment linked in the meantime is skipped
+            removed += delete_attachments(Attachment.objects.select_for_update()
+                                          .filter(id__in=ids, ticket=None, comment=None))
+        last_id = ids[-1]
+
+
+def collect_stale_uploads(before, batch_size=500):
+    """Delete resumable uploads that did not receive a chunk since ``before``."""
+    removed = 0
+    while True:
+        ids = list(Upload.objects.filter(last_update__lt=before).order_by("id").values_list("id", flat=True)
+                   [:batch_size])
+        if not ids:
+            return removed
+        with transaction.atomic():
+            uploads = Upload.objects.select_for_update().filter(id__in=ids, last_update__lt=before)
+            ids = list(uploads.values_list("id", flat=True))
+            schedule_removal([partial_upload_path(upload_id) for upload_id in ids])
+            uploads.delete()
+        removed += len(ids)
+
+
+def _scan(directory, before):
+    """Yield (path, name) of the files in ``directory`` last modified before the timestamp ``before``."""
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < before:
+                yield entry.path, entry.name
+
+
+def _upload_files(before):
+    """Yield (path, model, lookup, key) for every file of the upload directory older than ``before``."""
+    for path, name in _scan(UPLOAD_DIR, before):
+        if name.isdigit():
+            # attachments stored before the blob store
+            yield path, Attachment, "id", int(name)
+    blob_dir = os.path.join(UPLOAD_DIR, BLOB_DIR)
+    if os.path.isdir(blob_dir):
+        for prefix in sorted(os.listdir(blob_dir)):
+            for path, name in _scan(os.path.join(blob_dir, prefix), before):
+                if BLOB_NAME.match(name):
+                    yield path, Blob, "hash", name
+    for path, name in _scan(PARTIAL_UPLOAD_DIR, before):
+        try:
+            # partial files of one-shot uploads have no Upload row, the age check covers the running ones
+            yield path, Upload, "id", uuid.UUID(name)
+        except ValueError:
+            continue
+
+
+def _queue_files_without_rows(batch):
+    by_model = {}
+    for path, model, lookup, key in batch:
+        by_model.setdefault((model, lookup), []).append((path, key))
+    orphans = []
+    for (model, lookup), files in by_model.items():
+        rows = model.objects.filter(**{lookup + "__in": [key for path, key in files]})
+        if model is Attachment:
+            rows = rows.filter(blob=None)
+        existing = set(rows.values_list(lookup, flat=True))
+        orphans += [path for path, key in files if key not in existing]
+    queued = set(FileRemoval.objects.filter(path__in=orphans).values_list("path", flat=True))
+    orphans = [path for path in orphans if path not in queued]
+    schedule_removal(orphans)
+    return len(orphans)
+
+
+def collect_files_without_rows(before, batch_size=500):
+    """Queue files older than the timestamp ``before`` that no attachment, blob or upload refers to."""
+    found = 0
+    batch = []
+    for file in _upload_files(before):
+        batch.append(file)
+        if len(batch) >= batch_size:
+            found += _queue_files_without_rows(batch)
+            batch = []
+    if batch:
+        found += _queue_files_without_rows(batch)
+    return found
+
+
+def collect_attachments_without_files(delete=False, batch_size=500):
+    """Count attachments whose file is missing, with ``delete`` they are deleted as well."""
+    found = 0
+    last_id = 0
+    while True:
+        batch = list(Attachment.objects.filter(id__gt=last_id).select_related("blob").order_by("id")[:batch_size])
+        if not batch:
+            return found
+        missing = [attachment.id for attachment in batch
+                   if not os.path.isfile(os.path.join(UPLOAD_DIR, attachment_name(attachment)))]
+        found += len(missing)
+        if delete and missing:
+            with transaction.atomic():
+                delete_attachments(Attachment.objects.select_for_update().filter(id__in=missing))
+        last_id = batch[-1].id
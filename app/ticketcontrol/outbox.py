@@ -0,0 +1,113 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from . import system_settings
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_mails(mails):
+    """Queue (subject, html_message, recipient) tuples for send_queued_emails.
+
+    They are sent once the current transaction committed.
+    """
+    now = timezone.now()
+    sender = system_settings.mail_sender()
+    OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, html_message=html_message, from_email=sender, recipient=recipient,
+                      next_attempt=now)
+        for subject, html_message, recipient in mails
+    ], batch_size=500)
+
+
+def enqueue_mail(subject, html_message, recipient_list):
+    enqueue_mails([(subject, html_message, recipient) for recipient in recipient_list])
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(settings.EMAIL_RETRY_DELAY * 2 ** (attempts - 1), settings.EMAIL_MAX_RETRY_DELAY))
+
+
+def _claim(batch_size):
+    """Lease up to ``batch_size`` due mails, other workers skip them until EMAIL_SEND_LEASE passed."""
+    with transaction.atomic():
+        now = timezone.now()
+        batch = list(OutgoingEmail.objects.select_for_update(skip_locked=True)
+                     .filter(next_attempt__lte=now).order_by("next_attempt", "id")[:batch_size])
+        OutgoingEmail.objects.filter(id__in=[mail.id for mail in batch]) \
+            .update(next_attempt=now + timedelta(seconds=settings.EMAIL_SEND_LEASE))
+    return batch
+
+
+def _failed(mail, error):
+    mail.attempts += 1
+    mail.last_error = repr(error)
+    if mail.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        logger.error("Giving up sending mail " + str(mail.id) + " to " + mail.recipient)
+        mail.next_attempt = None
+    else:
+        mail.next_attempt = timezone.now() + retry_delay(mail.attempts)
+
+
+def send_queued_emails(batch_size=50):
+    """Send the due mails in batches over one SMTP connection, returns the number of sent mails.
+
+    A batch is leased in a short transaction and sent outside of it, the results are saved in a second one.
+    A failed mail is retried with an exponential backoff until EMAIL_MAX_ATTEMPTS is reached. When the server
+    cannot be reached the rest of the batch is left for the next run.
+    """
+    sent = 0
+    connection = system_settings.mail_connection()
+    try:
+        while True:
+            batch = _claim(batch_size)
+            if not batch:
+                return sent
+            done = []
+            failed = []
+            unsent = []
+            for position, mail in enumerate(batch):
+                message = EmailMultiAlternatives(mail.subject, "", mail.from_email, [mail.recipient],
+                                                 connection=connection)
+                message.attach_alternative(mail.html_message, "text/html")
+                try:
+                    connection.open()
+                except Exception as error:
+                    _failed(mail, error)
+                    failed.append(mail)
+                    unsent = batch[position + 1:]
+                    break
+                try:
+                    message.send()
+                except Exception as error:
+                    # the connection may be broken, the next mail opens a new one
+                    connection.close()
+                    _failed(mail, error)
+                    failed.append(mail)
+                    continue
+                done.append(mail.id)
+            with transaction.atomic():
+                OutgoingEmail.objects.filter(id__in=done).delete()
+                OutgoingEmail.objects.bulk_update(failed, ["attempts", "last_error", "next_attempt"])
+                OutgoingEmail.objects.filter(id__in=[mail.id for mail in unsent]).update(next_attempt=timezone.now())
+            sent += len(done)
+            if unsent:
+                return sent
+    finally:
+        connection.close()
+
+
+def run_outbox_worker(interval, batch_size=50):
+    while True:
+        try:
+            send_queued_emails(batch_size)
+        except Exception:
+            logger.exception("Unable to send queued mails")
+        time.sleep(interval)
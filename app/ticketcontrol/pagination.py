@@ -0,0 +1,91 @@
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = "ticketcontrol.pagination"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, objects, next_cursor=None, previous_cursor=None):
+        self.objects = objects
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+
+def parse_sort(value, sort_keys, default):
+    # "-creation_date" sorts descending, "creation_date" ascending
+    if not value:
+        value = default
+    descending = value.startswith("-")
+    key = value.lstrip("-")
+    if key not in sort_keys:
+        key = default.lstrip("-")
+        descending = default.startswith("-")
+    return key, descending
+
+
+def _encode_cursor(field, obj):
+    value = getattr(obj, field)
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return signing.dumps([field, value, obj.pk], salt=CURSOR_SALT, compress=True)
+
+
+def _decode_cursor(field, cursor):
+    try:
+        cursor_field, value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor()
+    if cursor_field != field:
+        # the sort key changed since the cursor was handed out
+        raise InvalidCursor()
+    if isinstance(value, str) and field.endswith("date"):
+        value = parse_datetime(value)
+    return value, pk
+
+
+def _seek(objects, field, value, pk, ascending):
+    # (field, pk) > (value, pk) written out so it can use a composite index on every backend
+    op = "gt" if ascending else "lt"
+    return objects.filter(Q(**{field + "__" + op: value}) | Q(**{field: value, "pk__" + op: pk}))
+
+
+def keyset_paginate(objects, field, descending=False, after=None, before=None, page_size=50):
+    """Return one page of ``objects`` ordered by ``(field, pk)``.
+
+    Pages are addressed by opaque cursors instead of offsets, so fetching a page costs
+    one index range scan regardless of how deep into the result set it is.
+    """
+    forward = before is None
+    ascending = descending != forward
+    ordering = (field, "pk") if ascending else ("-" + field, "-pk")
+    objects = objects.order_by(*ordering)
+
+    cursor = after if forward else before
+    if cursor:
+        value, pk = _decode_cursor(field, cursor)
+        objects = _seek(objects, field, value, pk, ascending)
+
+    rows = list(objects[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = _encode_cursor(field, rows[-1])
+        if (has_more and not forward) or (forward and cursor):
+            previous_cursor = _encode_cursor(field, rows[0])
+    return KeysetPage(rows, next_cursor, previous_cursor)
@@ -0,0 +1,64 @@
+import uuid
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Permission
+
+REFERENCE_VERSION_KEY = "reference:version"
+
+
+def reference_version():
+    version = cache.get(REFERENCE_VERSION_KEY)
+    if version is None:
+        cache.add(REFERENCE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(REFERENCE_VERSION_KEY)
+    return version
+
+
+def invalidate_reference_data():
+    cache.set(REFERENCE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class ReferenceData:
+    """Rarely changing rows kept in the memory of each worker.
+
+    Every access compares the worker's copy with the version in the shared cache, so a change made in one
+    worker is picked up by all others on their next access. Callers must not modify the returned objects.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.version = None
+        self.objects = []
+
+    def all(self):
+        version = reference_version()
+        if version != self.version:
+            self.objects = list(self.queryset.all())
+            self.version = version
+        return self.objects
+
+
+categories = ReferenceData(Category.objects.order_by("id"))
+groups = ReferenceData(Group.objects.order_by("id"))
+permissions = ReferenceData(Permission.objects.select_related("perm__content_type").order_by("id"))
+
+
+@receiver(post_save, sender=Category, dispatch_uid="reference_category_saved")
+@receiver(post_delete, sender=Category, dispatch_uid="reference_category_deleted")
+@receiver(post_save, sender=Group, dispatch_uid="reference_group_saved")
+@receiver(post_delete, sender=Group, dispatch_uid="reference_group_deleted")
+@receiver(post_save, sender=Permission, dispatch_uid="reference_permission_saved")
+@receiver(post_delete, sender=Permission, dispatch_uid="reference_permission_deleted")
+def reference_data_changed(sender, **kwargs):
+    invalidate_reference_data()
+
+
+@receiver(m2m_changed, sender=Category.groups.through, dispatch_uid="reference_category_groups_changed")
+@receiver(m2m_changed, sender=Group.permissions.through, dispatch_uid="reference_group_permissions_changed")
+def reference_relations_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_reference_data()
@@ -0,0 +1,164 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Comment, SearchIndexEntry, Ticket, TicketInbox
+
+TITLE_WEIGHT = 4
+DESCRIPTION_WEIGHT = 2
+LOCATION_WEIGHT = 2
+COMMENT_WEIGHT = 1
+
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 64
+MAX_RESULTS = 50
+MAX_CANDIDATES = 500
+TICKET_FIELDS = (("title", TITLE_WEIGHT), ("description", DESCRIPTION_WEIGHT), ("location", LOCATION_WEIGHT))
+COMMENT_FIELDS = (("content", COMMENT_WEIGHT),)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def _weigh(*fields):
+    weights = Counter()
+    for text, weight in fields:
+        for term in tokenize(text):
+            weights[term] += weight
+    return weights
+
+
+def ticket_weights(title, description, location, comments):
+    """Term weights of a ticket, ``comments`` are the contents of all of its comments."""
+    return _weigh((title, TITLE_WEIGHT), (description, DESCRIPTION_WEIGHT), (location, LOCATION_WEIGHT),
+                  *((content, COMMENT_WEIGHT) for content in comments))
+
+
+def index_ticket(ticket_id):
+    """Replace all index entries of the ticket with ones computed from it and its comments."""
+    with transaction.atomic():
+        title, description, location = Ticket.objects.select_for_update() \
+            .values_list("title", "description", "location").get(id=ticket_id)
+        comments = Comment.objects.filter(ticket_id=ticket_id).values_list("content", flat=True)
+        weights = ticket_weights(title, description, location, comments)
+        SearchIndexEntry.objects.filter(ticket_id=ticket_id).delete()
+        SearchIndexEntry.objects.bulk_create([
+            SearchIndexEntry(term=term, weight=weight, ticket_id=ticket_id) for term, weight in weights.items()
+        ])
+
+
+def _add_weights(ticket_id, weights):
+    weights = {term: weight for term, weight in weights.items() if weight}
+    if not weights:
+        return
+    with transaction.atomic():
+        # changes of the same ticket wait for each other, only one of them creates the entry of a new term
+        list(Ticket.objects.select_for_update().filter(id=ticket_id).values_list("id"))
+        entries = {entry.term: entry for entry in SearchIndexEntry.objects.filter(ticket_id=ticket_id,
+                                                                                  term__in=weights)}
+        created, changed, removed = [], [], []
+        for term, weight in weights.items():
+            entry = entries.get(term)
+            if entry is None:
+                if weight > 0:
+                    created.append(SearchIndexEntry(term=term, weight=weight, ticket_id=ticket_id))
+            elif entry.weight + weight > 0:
+                entry.weight += weight
+                changed.append(entry)
+            else:
+                removed.append(entry.id)
+        SearchIndexEntry.objects.bulk_create(created)
+        SearchIndexEntry.objects.bulk_update(changed, ["weight"])
+        SearchIndexEntry.objects.filter(id__in=removed).delete()
+
+
+def _update_index(instance, ticket_id, fields, raw, created, update_fields):
+    names = [name for name, weight in fields]
+    if raw or (update_fields is not None and not set(names).intersection(update_fields)):
+        return
+    values = [getattr(instance, name) for name in names]
+    # the values of the last indexing of this instance, or the ones it was loaded with
+    indexed = [None] * len(names) if created else getattr(instance, "_indexed_values", None)
+    loaded = getattr(instance, "_loaded_values", {})
+    if indexed is None and all(name in loaded for name in names):
+        indexed = [loaded[name] for name in names]
+    if values == indexed:
+        return
+    if indexed is None:
+        index_ticket(ticket_id)
+    else:
+        weights = _weigh(*((value, weight) for value, (name, weight) in zip(values, fields)))
+        weights.subtract(_weigh(*((value, weight) for value, (name, weight) in zip(indexed, fields))))
+        _add_weights(ticket_id, weights)
+    instance._indexed_values = values
+
+
+@receiver(post_save, sender=Ticket, dispatch_uid="search_index_ticket")
+def ticket_saved(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    _update_index(instance, instance.id, TICKET_FIELDS, raw, created, update_fields)
+
+
+@receiver(post_save, sender=Comment, dispatch_uid="search_index_comment")
+def comment_saved(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    _update_index(instance, instance.ticket_id, COMMENT_FIELDS, raw, created, update_fields)
+
+
+def _heaviest_tickets(terms, user):
+    """Return the ids of the MAX_CANDIDATES tickets with the highest weight of the rarest term.
+
+    Reads each posting from the (term, weight) index and stops after MAX_CANDIDATES entries. The candidates are
+    all matching tickets when the rarest term occurs in fewer tickets than that.
+    """
+    entries = SearchIndexEntry.objects.order_by("-weight", "-id")
+    if not user.has_perm("ticketcontrol.unhide_ticket"):
+        entries = entries.filter(ticket__hidden=False)
+    rarest = None
+    for term in terms:
+        ids = list(entries.filter(term=term).values_list("ticket_id", flat=True)[:MAX_CANDIDATES])
+        if rarest is None or len(ids) < len(rarest):
+            rarest = ids
+        if not ids:
+            break
+    return rarest
+
+
+def search_tickets(query, user, limit=MAX_RESULTS):
+    """Rank the tickets ``user`` may see by how well title, description, location and comments match ``query``.
+
+    Every query term has to occur somewhere in the ticket. The score is the sum of the term weights. When every
+    term occurs in more than MAX_CANDIDATES tickets, only the candidates of _heaviest_tickets are ranked.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    if user.has_perm("ticketcontrol.view_ticket"):
+        candidates = _heaviest_tickets(terms, user)
+        if not candidates:
+            return []
+    else:
+        # only the tickets in the inbox of the user, the cost grows with their number instead of all tickets
+        candidates = TicketInbox.objects.filter(user=user.id)
+        if not user.has_perm("ticketcontrol.unhide_ticket"):
+            candidates = candidates.filter(hidden=False)
+        candidates = candidates.values("ticket_id")
+    # one entry per term and ticket, a ticket matches when it has an entry for every term
+    ranked = SearchIndexEntry.objects.filter(term__in=terms, ticket__in=candidates) \
+        .values("ticket_id") \
+        .annotate(score=Sum("weight"), matched=Count("id")) \
+        .filter(matched=len(terms)) \
+        .order_by("-score", "-ticket_id")[:limit]
+    scores = {row["ticket_id"]: row["score"] for row in ranked}
+    results = list(Ticket.objects.filter(id__in=scores).select_related("owner", "category"))
+    for ticket in results:
+        ticket.score = scores[ticket.id]
+    results.sort(key=lambda ticket: (-ticket.score, -ticket.id))
+    return results
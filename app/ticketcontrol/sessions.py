@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.utils import timezone
+
+KEY_PREFIX = "ticketcontrol.sessions."
+
+
+class SessionStore(cached_db.SessionStore):
+    """Sessions in the database with the shared cache in front.
+
+    Requests read the session from the cache and only fall back to the database when it is not cached.
+    A session is written to both when its data changed or when its expiry date moved by more than
+    SESSION_REFRESH_INTERVAL since the last write, all other saves are skipped.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # (serialized data, expiry date) of the last load or write
+        self._stored = None
+
+    def _serialize(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        try:
+            stored = self._cache.get(self.cache_key)
+        except Exception:
+            # e.g. memcached raises on invalid keys, the session is reset like in cached_db
+            stored = None
+        if stored is None:
+            session = self._get_session_from_db()
+            if session is None:
+                return {}
+            stored = (self.decode(session.session_data), session.expire_date)
+            self._cache.set(self.cache_key, stored, self.get_expiry_age(expiry=session.expire_date))
+        data, expire_date = stored
+        if expire_date <= timezone.now():
+            self._session_key = None
+            return {}
+        self._stored = (self._serialize(data), expire_date)
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        serialized = self._serialize(data)
+        expire_date = self.get_expiry_date()
+        if not must_create and self._stored is not None and serialized == self._stored[0] and \
+                expire_date - self._stored[1] < timedelta(seconds=settings.SESSION_REFRESH_INTERVAL):
+            return
+        super(cached_db.SessionStore, self).save(must_create)
+        self._cache.set(self.cache_key, (data, expire_date), self.get_expiry_age())
+        self._stored = (serialized, expire_date)
+
+    @classmethod
+    def clear_expired(cls, batch_size=None):
+        """Delete the expired sessions in batches, each in its own short transaction."""
+        if batch_size is None:
+            batch_size = settings.SESSION_PURGE_BATCH_SIZE
+        sessions = cls.get_model_class().objects
+        now = timezone.now()
+        removed = 0
+        while True:
+            keys = list(sessions.filter(expire_date__lt=now).values_list("session_key", flat=True)[:batch_size])
+            if not keys:
+                return removed
+            removed += sessions.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
@@ -9,26 +9,20 @@ https://docs.djangoproject.com/en/4.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
-import json
 import os
-import shutil
 from pathlib import Path
 
 
-if not os.path.isfile("settings/settings.json"):
-    shutil.copy("settings/settings.json.example", "settings/settings.json")
-
-settings_file = open("settings/settings.json")
-settings = json.load(settings_file)
-settings_file.close()
-
-CONTENT = settings['content']
-REGISTER = settings['register']
-GENERAL = settings['general']
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# System settings (content, register, general, email_server) live in the database and are edited on the
+# settings page. These files only provide the values of sections that were never saved there.
+SYSTEM_SETTINGS_FILES = [
+    BASE_DIR / "settings" / "settings.json",
+    BASE_DIR / "settings" / "settings.json.example",
+]
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
@@ -106,13 +100,80 @@ DATABASES = {
     }
 }
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = settings["email_server"]["smtp_host"]
-EMAIL_POST = settings["email_server"]["smtp_port"]
-EMAIL_USE_TLS = settings["email_server"]["smtp_use_tls"]
-EMAIL_USE_SSL = settings["email_server"]["smtp_use_ssl"]
-EMAIL_HOST_USER = settings["email_server"]["smtp_user"]
-EMAIL_HOST_PASSWORD = settings["email_server"]["smtp_password"]
+# Cache shared by all uwsgi workers, used for permissions, reference data versions, sessions and throttling.
+# The compose files run memcached for it (CACHE_BACKEND / CACHE_LOCATION). The file cache is only a fallback for
+# single container setups: it lists its directory on every set and culls entries at random, which can drop the
+# version keys and costs more than the lookups it saves.
+if os.environ.get("CACHE_BACKEND"):
+    CACHES = {
+        "default": {
+            "BACKEND": os.environ.get("CACHE_BACKEND"),
+            "LOCATION": os.environ.get("CACHE_LOCATION"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "/tmp/ticketcontrol-cache"),
+            "OPTIONS": {
+                "MAX_ENTRIES": 10000,
+            },
+        }
+    }
+
+# sessions are read from the cache and written to the database only when they changed or their expiry date
+# moved by SESSION_REFRESH_INTERVAL seconds, they expire SESSION_COOKIE_AGE after the last request
+SESSION_ENGINE = "ticketcontrol.sessions"
+SESSION_SAVE_EVERY_REQUEST = True
+SESSION_REFRESH_INTERVAL = int(os.environ.get("SESSION_REFRESH_INTERVAL", 60 * 60))
+# expired sessions are deleted by clearsessions in batches of this size
+SESSION_PURGE_BATCH_SIZE = int(os.environ.get("SESSION_PURGE_BATCH_SIZE", 1000))
+
+# size of the chunks of resumable attachment uploads, every request must fit into the proxy's MAX_REQUEST_SIZE
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+# largest attachment in bytes, the proxy only limits the size of each chunk
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE") or 20 * 1024 * 1024)
+
+# shared with the proxy, attachment download links are signed and served by nginx when set
+ATTACHMENT_URL_SECRET = os.environ.get("ATTACHMENT_URL_SECRET", "")
+ATTACHMENT_URL_LIFETIME = int(os.environ.get("ATTACHMENT_URL_LIFETIME", 10 * 60))
+
+# host, port and credentials come from the email_server system settings, see ticketcontrol.system_settings
+# e.g. django.core.mail.backends.filebased.EmailBackend with EMAIL_FILE_PATH to write mails to files instead
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH")
+
+# mails are queued and sent by send_queued_emails, failed mails are retried with an exponential backoff
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 8))
+EMAIL_RETRY_DELAY = int(os.environ.get("EMAIL_RETRY_DELAY", 60))
+EMAIL_MAX_RETRY_DELAY = int(os.environ.get("EMAIL_MAX_RETRY_DELAY", 6 * 60 * 60))
+# seconds a claimed batch is kept from other workers, mails of a crashed worker are sent again after it
+EMAIL_SEND_LEASE = int(os.environ.get("EMAIL_SEND_LEASE", 60 * 60))
+# seconds until a blocking SMTP operation fails
+EMAIL_TIMEOUT = int(os.environ.get("EMAIL_TIMEOUT", 30))
+
+# ticket activity is collected for this many seconds and then sent as one digest per member
+NOTIFICATION_DIGEST_WINDOW = int(os.environ.get("NOTIFICATION_DIGEST_WINDOW", 10 * 60))
+# used for the links in mails that are not sent from a request
+SITE_DOMAIN = os.environ.get("SITE_DOMAIN", ALLOWED_HOSTS[0] if ALLOWED_HOSTS else "localhost")
+
+# login attempts and password reset requests per client IP and per account within a sliding window of seconds.
+# The counters are kept in THROTTLE_STORE, ticketcontrol.throttle.CacheStore needs a memcached or redis cache and
+# ticketcontrol.throttle.LocalStore counts in each worker on its own.
+THROTTLE_STORE = os.environ.get("THROTTLE_STORE", "ticketcontrol.throttle.DatabaseStore")
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get("LOGIN_ATTEMPTS_PER_IP", 30))
+LOGIN_ATTEMPTS_PER_ACCOUNT = int(os.environ.get("LOGIN_ATTEMPTS_PER_ACCOUNT", 10))
+LOGIN_THROTTLE_WINDOW = int(os.environ.get("LOGIN_THROTTLE_WINDOW", 15 * 60))
+PASSWORD_RESET_REQUESTS_PER_IP = int(os.environ.get("PASSWORD_RESET_REQUESTS_PER_IP", 10))
+PASSWORD_RESET_REQUESTS_PER_ACCOUNT = int(os.environ.get("PASSWORD_RESET_REQUESTS_PER_ACCOUNT", 3))
+PASSWORD_RESET_THROTTLE_WINDOW = int(os.environ.get("PASSWORD_RESET_THROTTLE_WINDOW", 60 * 60))
+
+AUTH_USER_MODEL = "ticketcontrol.User"
+
+AUTHENTICATION_BACKENDS = [
+    "ticketcontrol.backends.CachedPermissionBackend",
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -1,18 +1,58 @@
+const UPLOAD_RETRIES = 5;
+
+async function upload_chunks(upload, file, token) {
+    let retries = 0;
+    while (upload.offset < upload.size) {
+        let chunk = file.slice(upload.offset, upload.offset + upload.chunk_size);
+        let response;
+        try {
+            response = await fetch("/attachment/upload/" + upload.id + "?offset=" + upload.offset, {
+                method: "PUT",
+                headers: {'X-CSRFToken': token, 'Content-Type': 'application/octet-stream'},
+                body: chunk
+            });
+        } catch (error) {
+        }
+        if (typeof response !== "undefined" && (response.ok || response.status === 409)) {
+            // 409: the server has a different offset (e.g. an earlier attempt arrived), continue from there
+            upload = await response.json();
+            retries = 0;
+        } else if (typeof response !== "undefined" && response.status < 500) {
+            return false;
+        } else if (++retries > UPLOAD_RETRIES) {
+            return false;
+        } else {
+            // the connection dropped, retry the chunk, a 409 tells if it was received after all
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        }
+    }
+    return true;
+}
+
 async function upload_attachment(file, file_link, drop_box, ticket, comment) {
     let token = document.querySelector('[name=csrfmiddlewaretoken]').value;
     let form_data = new FormData();
-    form_data.append("attachment", file);
+    form_data.append("filename", file.name);
+    form_data.append("size", file.size);
     if (typeof ticket !== "undefined") {
         form_data.append("ticket", ticket);
     } else if (typeof comment !== "undefined") {
         form_data.append("comment", comment);
     }
 
-    let response = await fetch("/attachment/upload", {
+    let response = await fetch("/attachment/upload/init", {
         method: "POST",
         headers: {'X-CSRFToken': token},
         body: form_data
     });
+    if (!response.ok) return;
+    let upload = await response.json();
+    if (!await upload_chunks(upload, file, token)) return;
+
+    response = await fetch("/attachment/upload/" + upload.id + "/finalize", {
+        method: "POST",
+        headers: {'X-CSRFToken': token}
+    });
 
     if (response.ok) {
         let id = await response.text();
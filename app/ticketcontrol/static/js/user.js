@@ -35,7 +35,7 @@ async function search_and_update_usernames(typed_username, id, multiple_enable=t
     } else {
         typed = typed_username.trim();
     }
-    let users = await (await fetch(`/user/live_search/${typed || "_"}`)).json();
+    let users = await (await fetch(`/user/autocomplete?q=${encodeURIComponent(typed)}`)).json();
     let dropdown = $("#"+id);
     dropdown.children().remove();
     for (user of users) {
@@ -0,0 +1,102 @@
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+
+from .models import SystemSetting
+
+SECTIONS = ("content", "register", "general", "email_server")
+SETTINGS_VERSION_KEY = "system-settings:version"
+
+
+def settings_version():
+    version = cache.get(SETTINGS_VERSION_KEY)
+    if version is None:
+        cache.add(SETTINGS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SETTINGS_VERSION_KEY)
+    return version
+
+
+def invalidate_settings():
+    cache.set(SETTINGS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def load_settings_file():
+    for path in settings.SYSTEM_SETTINGS_FILES:
+        try:
+            with open(path) as settings_file:
+                return json.load(settings_file)
+        except FileNotFoundError:
+            continue
+    return {}
+
+
+class SettingsStore:
+    """System settings shared by all workers.
+
+    Each worker keeps the sections in memory and reloads them from the database when the version in the shared
+    cache changed, so a change saved by one worker is live in all of them on their next request.
+    Sections that were never saved fall back to the settings file.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.sections = {}
+
+    def load(self):
+        version = settings_version()
+        if version != self.version:
+            defaults = load_settings_file()
+            rows = {row.section: row for row in SystemSetting.objects.all()}
+            self.sections = {section: rows[section].value if section in rows else defaults.get(section, {})
+                             for section in SECTIONS}
+            self.version = version
+        return self.sections
+
+    def section(self, name):
+        return self.load()[name]
+
+    def save(self, sections):
+        with transaction.atomic():
+            for section, value in sections.items():
+                if section not in SECTIONS:
+                    raise KeyError(section)
+                updated = SystemSetting.objects.filter(section=section) \
+                    .update(value=value, version=F("version") + 1)
+                if not updated:
+                    SystemSetting.objects.create(section=section, value=value)
+            transaction.on_commit(invalidate_settings)
+
+
+store = SettingsStore()
+
+
+def content():
+    return store.section("content")
+
+
+def register():
+    return store.section("register")
+
+
+def general():
+    return store.section("general")
+
+
+def email_server():
+    return store.section("email_server")
+
+
+def mail_connection(**kwargs):
+    server = email_server()
+    return get_connection(host=server["smtp_host"], port=server["smtp_port"], username=server["smtp_user"],
+                          password=server["smtp_password"], use_tls=server["smtp_use_tls"],
+                          use_ssl=server["smtp_use_ssl"], **kwargs)
+
+
+def mail_sender():
+    return email_server()["smtp_user"]
@@ -0,0 +1,187 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ThrottleCounter
+
+THROTTLES = ("login", "passwordreset")
+REJECTED_KEY = "throttle:rejected:"
+LOCAL_STORE_MAX_KEYS = 100000
+
+
+class DatabaseStore:
+    """Counters in ThrottleCounter rows, shared by all workers. Every hit is one atomic UPDATE."""
+
+    def incr(self, key, timeout):
+        now = timezone.now()
+        expires = now + timedelta(seconds=timeout) if timeout is not None else None
+        counters = ThrottleCounter.objects.filter(key=key)
+        updated = counters.update(
+            count=Case(When(expires__lte=now, then=Value(1)), default=F("count") + 1,
+                       output_field=models.PositiveIntegerField()),
+            expires=Case(When(expires__lte=now, then=Value(expires)), default=F("expires"),
+                         output_field=models.DateTimeField()))
+        if not updated:
+            try:
+                with transaction.atomic():
+                    ThrottleCounter.objects.create(key=key, count=1, expires=expires)
+                return 1
+            except IntegrityError:
+                # created by a concurrent hit
+                counters.update(count=F("count") + 1)
+        return counters.values_list("count", flat=True).get()
+
+    def get_many(self, keys):
+        return dict(ThrottleCounter.objects.filter(models.Q(expires=None) | models.Q(expires__gt=timezone.now()),
+                                                   key__in=keys).values_list("key", "count"))
+
+    @staticmethod
+    def clear_expired(batch_size=1000):
+        removed = 0
+        while True:
+            ids = list(ThrottleCounter.objects.filter(expires__lte=timezone.now()).order_by("id")
+                       .values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return removed
+            removed += ThrottleCounter.objects.filter(id__in=ids).delete()[0]
+
+
+class CacheStore:
+    """Counters in the default cache, shared by all workers that use the same cache.
+
+    Only memcached and redis increment atomically, keep the timeout of the key and are shared by the workers. The
+    file based cache writes every increment with its default timeout and loses concurrent ones. The local memory
+    cache is per process and would multiply the limits by the number of workers, it is only accepted with DEBUG.
+    """
+
+    def __init__(self):
+        backends = (BaseMemcachedCache, RedisCache, LocMemCache) if settings.DEBUG else (BaseMemcachedCache, RedisCache)
+        if not isinstance(caches["default"], backends):
+            raise ImproperlyConfigured("CacheStore needs a memcached or redis cache, use DatabaseStore instead")
+
+    def incr(self, key, timeout):
+        if cache.add(key, 1, timeout):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # expired between add and incr
+            cache.set(key, 1, timeout)
+            return 1
+
+    def get_many(self, keys):
+        return cache.get_many(keys)
+
+
+class LocalStore:
+    """Counters in the memory of the current process, every worker counts on its own."""
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        self.counters = {key: entry for key, entry in self.counters.items() if entry[1] > now}
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self.lock:
+            value, expires = self.counters.get(key, (0, 0))
+            if expires <= now:
+                if len(self.counters) >= LOCAL_STORE_MAX_KEYS:
+                    self._expire(now)
+                value, expires = 0, now + timeout if timeout is not None else math.inf
+            self.counters[key] = (value + 1, expires)
+            return value + 1
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self.lock:
+            return {key: self.counters[key][0] for key in keys
+                    if key in self.counters and self.counters[key][1] > now}
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+class Throttle:
+    """At most ``limit`` hits per key within a sliding window of ``window`` seconds.
+
+    The window is approximated from two fixed buckets: the hits of the current bucket plus the share of the
+    previous bucket that still lies within the window.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def _key(self, key, bucket):
+        # user input, hashed to get a valid memcached key
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return "throttle:" + self.name + ":" + digest + ":" + str(bucket)
+
+    def hit(self, key, now=None):
+        """Count a hit for ``key``, returns False when the limit is exceeded."""
+        if now is None:
+            now = time.time()
+        bucket, elapsed = divmod(now, self.window)
+        store = get_store()
+        current = store.incr(self._key(key, int(bucket)), 2 * self.window)
+        previous_key = self._key(key, int(bucket) - 1)
+        previous = store.get_many([previous_key]).get(previous_key, 0)
+        return previous * (1 - elapsed / self.window) + current <= self.limit
+
+
+def client_ip(request):
+    # nginx passes the address of the client in REMOTE_ADDR
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def throttle_request(request, name, account, ip_limit, account_limit, window):
+    """Count the request for the client IP and for the ``account`` it targets.
+
+    Returns False when either of them exceeded its limit. It is called before any password is checked or mail
+    is sent, a rejected request only costs the counter updates.
+    """
+    checks = [(Throttle(name + ":ip", ip_limit, window), client_ip(request))]
+    if account:
+        checks.append((Throttle(name + ":account", account_limit, window), account.strip().lower()))
+    for throttle, key in checks:
+        if not throttle.hit(key):
+            # the store of the counters may evict, the totals are kept
+            DatabaseStore().incr(REJECTED_KEY + name, None)
+            return False
+    return True
+
+
+def login_allowed(request, username):
+    return throttle_request(request, "login", username, settings.LOGIN_ATTEMPTS_PER_IP,
+                            settings.LOGIN_ATTEMPTS_PER_ACCOUNT, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def password_reset_allowed(request, username):
+    return throttle_request(request, "passwordreset", username, settings.PASSWORD_RESET_REQUESTS_PER_IP,
+                            settings.PASSWORD_RESET_REQUESTS_PER_ACCOUNT, settings.PASSWORD_RESET_THROTTLE_WINDOW)
+
+
+def rejected_counts():
+    """Return the number of rejected requests per throttle."""
+    counts = DatabaseStore().get_many([REJECTED_KEY + name for name in THROTTLES])
+    return {name: counts.get(REJECTED_KEY + name, 0) for name in THROTTLES}
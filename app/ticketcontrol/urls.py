@@ -28,6 +28,7 @@ urlpatterns = [
     path('ticket/my', mytickets_view, name='my_tickets'),
     path('ticket/manage', ticket_manage_view, name='manage_tickets'),
     path('ticket/new', ticket_new_view, name='create_ticket'),
+    path('ticket/search', ticket_search_view, name='search_tickets'),
     path('ticket/<int:id>', ticket_view, name="ticket_view"),
     path('ticket/<int:id>/close', ticket_close, name="close_ticket"),
     path('ticket/<int:id>/hide', ticket_hide, name="hide_ticket"),
@@ -48,6 +49,9 @@ urlpatterns = [
     path('attachment/<int:id>/name/<str:name>', attachment_access_control, name='attachment'),
     path('attachment/<int:id>/delete', attachment_edit, name="delete_attachment"),
     path('attachment/upload', attachment_upload, name="upload_attachment"),
+    path('attachment/upload/init', attachment_upload_init, name="init_upload"),
+    path('attachment/upload/<uuid:id>', attachment_upload_chunk, name="upload_chunk"),
+    path('attachment/upload/<uuid:id>/finalize', attachment_upload_finalize, name="finalize_upload"),
     path('login/', login_view, name='login'),
     path('logout/', logout_view, name='logout'),
     path('register/', register_view, name='register'),
@@ -60,8 +64,7 @@ urlpatterns = [
     path('user/passwordreset/request', user_passwordreset_request_view, name='reset_password_request'),
     path('user/profile', profile_view, name='profile'),
     path('user/manage', user_manage_view, name='manage_users'),
-    path('user/live_search/<str:typed_username>', username_live_search, name='user_live_search'),
-    path('user/live_search/', username_live_search, name='user_live_search'),
+    path('user/autocomplete', user_autocomplete, name='user_autocomplete'),
     path('user/check_username/<str:username>', username_check_view, name='check_username'),
     path('group/manage', group_manage_view, name='manage_groups'),
     path('group/create', group_create_view, name='create_group'),
@@ -0,0 +1,77 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import User
+
+QUERY_BATCH_SIZE = 100
+CREATE_ATTEMPTS = 5
+
+
+def _suffix(username, base):
+    """0 for the base itself, N for base + str(N), None for every other name starting with the base."""
+    rest = username[len(base):]
+    if rest == "":
+        return 0
+    if rest.isdigit() and not rest.startswith("0"):
+        return int(rest)
+    return None
+
+
+def allocate_usernames(bases, old_username=None):
+    """Return a free username for each entry of ``bases``, the base itself or the base with the lowest free suffix.
+
+    The existing ``base<N>`` names of up to QUERY_BATCH_SIZE bases are loaded with one prefix query on the
+    username index, the regex keeps other names with the same prefix out of the result.
+    Repeated bases get different names, so a whole import can be allocated at once.
+    ``old_username`` counts as free, it is the current name of the user that is renamed.
+    Names are compared case-insensitively like the unique index of the database does.
+    """
+    distinct = list(dict.fromkeys(base.lower() for base in bases))
+    taken = {base: set() for base in distinct}
+    for i in range(0, len(distinct), QUERY_BATCH_SIZE):
+        batch = distinct[i:i + QUERY_BATCH_SIZE]
+        prefixes = Q()
+        for base in batch:
+            prefixes |= Q(username__istartswith=base, username__iregex="^" + re.escape(base) + "([1-9][0-9]*)?$")
+        for username in User.objects.filter(prefixes).values_list("username", flat=True):
+            username = username.lower()
+            if old_username is not None and username == old_username.lower():
+                continue
+            for base in batch:
+                if username.startswith(base):
+                    suffix = _suffix(username, base)
+                    if suffix is not None:
+                        taken[base].add(suffix)
+
+    usernames = []
+    for base in bases:
+        suffixes = taken[base.lower()]
+        suffix = 0
+        while suffix in suffixes:
+            suffix += 1
+        suffixes.add(suffix)
+        usernames.append(base + str(suffix) if suffix else base)
+    return usernames
+
+
+def free_username(base, old_username=None):
+    return allocate_usernames([base], old_username)[0]
+
+
+def create_with_free_username(base, create):
+    """Call ``create(username)`` with a free username derived from ``base`` and return its result.
+
+    The unique index on the username is the reservation: when a concurrent registration took the allocated
+    name first, the next free one is allocated and tried.
+    """
+    for attempt in range(CREATE_ATTEMPTS):
+        username = free_username(base)
+        try:
+            with transaction.atomic():
+                return create(username)
+        except IntegrityError:
+            if not User.objects.filter(username__iexact=username).exists():
+                raise
+    raise IntegrityError("Unable to allocate a free username for " + base)
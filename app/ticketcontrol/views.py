@@ -1,8 +1,8 @@
-import json
+import copy
 import logging
 import os
 import re
-from smtplib import SMTPRecipientsRefused
+import uuid
 
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, permission_required
@@ -15,12 +15,23 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.template.loader import render_to_string
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.db.utils import DataError
 
 from django.views.static import serve
 
 from .models import *
+from .inbox import user_tickets
+from . import reference, system_settings, throttle
+from .acl import access_control
+from .autocomplete import user_index
+from .files import (PARTIAL_UPLOAD_DIR, UPLOAD_DIR, IncompleteChunk, add_blob_reference, attachment_name,
+                    attachment_url, content_hash, delete_attachments, partial_upload_path, save_uploaded_file,
+                    write_chunk)
+from .pagination import InvalidCursor, keyset_paginate, parse_sort
+from .search import search_tickets
+from .usernames import create_with_free_username, free_username
 
 logger = logging.getLogger(__name__)
 
@@ -36,12 +47,14 @@ def render_error(request, status, message=""):
         409: "Conflict",
         410: "Gone",
         411: "Length Required",
+        413: "Payload Too Large",
+        429: "Too Many Requests",
         498: "Token Expired / Invalid",
         500: "Internal Server Error"
     }
     title = str(status) + " - " + title_list.get(status, "")
 
-    context = {'title': title, 'message': message, 'status': status, 'meme_mode': settings.GENERAL['meme_mode']}
+    context = {'title': title, 'message': message, 'status': status, 'meme_mode': system_settings.general()['meme_mode']}
     return render(request, "error.html", context, status=status)
 
 
@@ -51,25 +64,19 @@ def handler404(request, exception):
 
 def dashboard_view(request):
     if request.user.is_authenticated:
-        own_tickets = Ticket.objects.filter(owner=request.user.id, hidden=False).exclude(
-            status=str(Ticket.StatusChoices.CLOSED))
-        part_tickets = Ticket.objects.filter(participating=request.user.id, hidden=False).exclude(
-            owner=request.user.id).exclude(status=str(Ticket.StatusChoices.CLOSED))
-        context = {'tickets': {'own': own_tickets, 'part': part_tickets}}
+        tickets = user_tickets(request.user.id)
+        context = {'tickets': {'own': tickets['own'], 'part': tickets['part']}}
         return render(request, "dashboard.html", context)
     else:
-        return render(request, "home.html", {"content": settings.CONTENT['frontpage']})
+        return render(request, "home.html", {"content": system_settings.content()['frontpage']})
 
 
 @login_required()
 def mytickets_view(request):
-    own_tickets = Ticket.objects.filter(owner=request.user.id, hidden=False).exclude(
-        status=str(Ticket.StatusChoices.CLOSED))
-    part_tickets = Ticket.objects.filter(participating=request.user.id, hidden=False).exclude(
-        owner=request.user.id).exclude(moderators=request.user.id).exclude(status=str(Ticket.StatusChoices.CLOSED))
-    mod_tickets = Ticket.objects.filter(moderators=request.user.id, hidden=False).exclude(
-        owner=request.user.id).exclude(status=str(Ticket.StatusChoices.CLOSED))
-    context = {'tickets': {'own': own_tickets, 'part': part_tickets, 'mod': mod_tickets}}
+    tickets = user_tickets(request.user.id)
+    mod_ids = [ticket.id for ticket in tickets['mod']]
+    part_tickets = [ticket for ticket in tickets['part'] if ticket.id not in mod_ids]
+    context = {'tickets': {'own': tickets['own'], 'part': part_tickets, 'mod': tickets['mod']}}
     return render(request, "ticket/my.html", context)
 
 
@@ -122,15 +129,35 @@ def handle_user_filter(GET, objects, name):
     return objects
 
 
+TICKETS_PER_PAGE = 50
+TICKET_SORT_KEYS = {
+    "creation_date": "creation_date",
+    "id": "id",
+    "status": "status",
+    "category": "category_id",
+}
+TICKET_SORT_CHOICES = [
+    ("-creation_date", "Datum (neueste zuerst)"),
+    ("creation_date", "Datum (älteste zuerst)"),
+    ("-id", "Id (absteigend)"),
+    ("id", "Id (aufsteigend)"),
+    ("status", "Status"),
+    ("category", "Kategorie"),
+]
+
+
+def page_query(GET, **cursor):
+    query = GET.copy()
+    query.pop("after", None)
+    query.pop("before", None)
+    for key, value in cursor.items():
+        query[key] = value
+    return query.urlencode()
+
+
 @login_required()
 def ticket_manage_view(request):
-    if request.user.has_perm("ticketcontrol.view_ticket"):
-        tickets = Ticket.objects.all()
-    else:
-        tickets = Ticket.objects.filter(Q(owner=request.user.id) |
-                                        Q(participating=request.user.id) |
-                                        Q(moderators=request.user.id)).distinct()
-
+    tickets = Ticket.objects.listed_for(request.user)
     tickets = handle_filter(request.GET, tickets, "status")
     tickets = handle_filter(request.GET, tickets, "category")
     tickets = handle_filter(request.GET, tickets, "title")
@@ -147,44 +174,67 @@ def ticket_manage_view(request):
     except User.DoesNotExist:
         return render_error(request, 404, "Filtered user does not exist")
 
+    sort_key, descending = parse_sort(request.GET.get("sort"), TICKET_SORT_KEYS, TICKET_SORT_CHOICES[0][0])
+    tickets = tickets.select_related("owner", "category").prefetch_related("participating", "moderators")
+    try:
+        page = keyset_paginate(tickets, TICKET_SORT_KEYS[sort_key], descending,
+                               after=request.GET.get("after"), before=request.GET.get("before"),
+                               page_size=TICKETS_PER_PAGE)
+    except InvalidCursor:
+        return render_error(request, 400, "Invalid page cursor")
+
     context = {
-        "tickets": tickets,
+        "tickets": page,
+        "next_query": page_query(request.GET, after=page.next_cursor) if page.next_cursor else None,
+        "previous_query": page_query(request.GET, before=page.previous_cursor) if page.previous_cursor else None,
+        "sort": ("-" if descending else "") + sort_key,
+        "sort_choices": TICKET_SORT_CHOICES,
         "GET": request.GET,
         "types": ["is", "is_not", "contain", "contain_not"],
-        "categories": Category.objects.all(),
+        "categories": reference.categories.all(),
         "status_choices": Ticket.StatusChoices,
-        "allow_location": settings.GENERAL["allow_location"]
+        "allow_location": system_settings.general()["allow_location"]
     }
     if "category" in request.GET and request.GET["category"]:
         context["category_id"] = int(request.GET["category"])
     return render(request, "ticket/manage.html", context)
 
 
+@login_required()
+def ticket_search_view(request):
+    query = request.GET.get("q", "").strip()
+    results = search_tickets(query, request.user) if query else []
+    return render(request, "ticket/search.html", {"query": query, "tickets": results})
+
+
 @login_required()
 def ticket_view(request, id):
+    if not access_control(request).can_view_ticket(id):
+        return render_error(request, 404, "Ticket does not exist")
     try:
-        ticket = Ticket.objects.get(pk=id)
-        if ticket.hidden and not request.user.has_perm("ticketcontrol.unhide_ticket"):
-            return render_error(request, 404, "Ticket does not exist")
-        user = User.objects.get(id=request.user.id)
-        if ticket.owner.id != request.user.id and not user in ticket.participating.all() \
-                and not user in ticket.moderators.all() and not request.user.has_perm("ticketcontrol.view_ticket"):
-            return render_error(request, 404, "Ticket does not exist")
-        comments = Comment.objects.filter(ticket_id=ticket.id)
-
-        categories = Category.objects.all()
+        ticket = Ticket.objects.select_related("owner", "category") \
+            .prefetch_related("participating", "moderators", "attachment_set__blob").get(pk=id)
+        comments = list(Comment.objects.filter(ticket_id=ticket.id).select_related("user")
+                        .prefetch_related("attachment_set__blob").order_by("id"))
+        for attachment in ticket.attachment_set.all():
+            attachment.url = attachment_url(attachment, request.user.id)
+        for comment in comments:
+            for attachment in comment.attachment_set.all():
+                attachment.url = attachment_url(attachment, request.user.id)
+
+        categories = reference.categories.all()
         moderators = ticket.moderators.all()
         self_assign = True
-        if user.has_perm("ticketcontrol.assign_ticket"):
+        if request.user.has_perm("ticketcontrol.assign_ticket"):
             for moderator in moderators:
-                if moderator.id == user.id:
+                if moderator.id == request.user.id:
                     self_assign = False
                     break
         context = {"ticket": ticket, "moderators": moderators,
                    "participants": ticket.participating.all(), "comments": comments, "categories": categories,
                    "self_assign": self_assign,
-                   "allow_location": settings.GENERAL["allow_location"],
-                   "force_location": settings.GENERAL["force_location"]}
+                   "allow_location": system_settings.general()["allow_location"],
+                   "force_location": system_settings.general()["force_location"]}
         return render(request, "ticket/detail.html", context)
     except Ticket.DoesNotExist:
         return render_error(request, 404, "Ticket does not exist")
@@ -193,19 +243,15 @@ def ticket_view(request, id):
 @login_required()
 def ticket_new_view(request):
     if request.method == 'POST':
-        try:
-            user = User.objects.get(id=request.user.id)
-        except User.DoesNotExist:
-            return render_error(request, 404, "User does not exist")
         location = None
-        if settings.GENERAL["allow_location"]:
+        if system_settings.general()["allow_location"]:
             location = request.POST["location"]
-            if settings.GENERAL["force_location"] and not location:
+            if system_settings.general()["force_location"] and not location:
                 return render_error(request, 406, "You have to fill in the location")
         if not request.POST["title"] or not request.POST["description"]:
             return render_error(request, 406, "You have to fill in title and description.")
         try:
-            ticket = Ticket.add_ticket(request.POST["title"], request.POST["description"], user,
+            ticket = Ticket.add_ticket(request.POST["title"], request.POST["description"], request.user,
                                        Category.objects.get(id=request.POST["category"]), location)
         except DataError:
             return render_error(request, 400,
@@ -220,9 +266,9 @@ def ticket_new_view(request):
         ticket.save()
         return redirect('/ticket/my')
     else:
-        context = {"categories": Category.objects.all(),
-                   "allow_location": settings.GENERAL["allow_location"],
-                   "force_location": settings.GENERAL["force_location"]}
+        context = {"categories": reference.categories.all(),
+                   "allow_location": system_settings.general()["allow_location"],
+                   "force_location": system_settings.general()["force_location"]}
         return render(request, "ticket/new.html", context)
 
 
@@ -231,18 +277,14 @@ def ticket_comment_add(request, id):
     if request.method == 'POST':
         try:
             ticket = Ticket.objects.get(id=id)
-            user = User.objects.get(id=request.user.id)
         except Ticket.DoesNotExist:
             return render_error(request, 404, "Ticket does not exist")
-        except User.DoesNotExist:
-            return render_error(request, 404, "User does not exist")
-        if ticket.owner.id != request.user.id and not request.user in ticket.participating.all() and not request.user.has_perm(
-                "ticketcontrol.view_ticket"):
+        if not access_control(request).can_view_ticket(ticket.id):
             return render_error(request, 404, "Ticket does not exist")
         if not request.POST["comment"]:
             return render_error(request, 406, "Comment is empty")
         try:
-            comment = ticket.add_comment(request.POST["comment"], user)
+            comment = ticket.add_comment(request.POST["comment"], request.user)
         except DataError:
             return render_error(request, 400,
                                 "DataError: invalid data supplied (maybe too many characters in one field)")
@@ -287,8 +329,13 @@ def ticket_participant_add(request, id, username=None):
             return render_error(request, 406, "Username is required")
         try:
             ticket = Ticket.objects.get(id=id)
-            if request.user.id == ticket.owner.id or request.user.has_perm("ticketcontrol.change_ticket"):
-                ticket.participating.add(User.objects.get(username=username))
+            if access_control(request).can_change_ticket(ticket.id):
+                participant = User.objects.get(username=username)
+                # adding a participant twice changes nothing, members are only notified once
+                if not ticket.participating.filter(id=participant.id).exists():
+                    ticket.participating.add(participant)
+                    TicketEvent.objects.create(ticket=ticket, kind=TicketEvent.KindChoices.PARTICIPANT,
+                                               actor_id=request.user.id, detail=participant.username)
                 return HttpResponse(status=200)
             return render_error(request, 404, "Ticket does not exist")
         except Ticket.DoesNotExist:
@@ -305,9 +352,13 @@ def ticket_moderator_add(request, id, username=None):
             return render_error(request, 406, "Username is required")
         try:
             ticket = Ticket.objects.get(id=id)
-            ticket.moderators.add(User.objects.get(username=username))
+            moderator = User.objects.get(username=username)
+            if not ticket.moderators.filter(id=moderator.id).exists():
+                ticket.moderators.add(moderator)
+                TicketEvent.objects.create(ticket=ticket, kind=TicketEvent.KindChoices.MODERATOR,
+                                           actor_id=request.user.id, detail=moderator.username)
             if ticket.status == "Unassigned":
-                ticket.set_status("Assigned")
+                ticket.set_status("Assigned", request.user.id)
                 ticket.save()
             return HttpResponse(status=200)
         except Ticket.DoesNotExist:
@@ -336,7 +387,7 @@ def ticket_participant_remove(request, id, username):
     if request.method == "POST":
         try:
             ticket = Ticket.objects.get(id=id)
-            if request.user.id == ticket.owner.id or request.user.has_perm("ticketcontrol.change_ticket"):
+            if access_control(request).can_change_ticket(ticket.id):
                 ticket.participating.remove(User.objects.get(username=username))
                 return HttpResponse(status=200)
             else:
@@ -353,7 +404,7 @@ def ticket_status_update(request, id):
     if request.method == "POST":
         try:
             ticket = Ticket.objects.get(id=id)
-            ticket.set_status(request.POST['status_choice'])
+            ticket.set_status(request.POST['status_choice'], request.user.id)
             return redirect("ticket_view", id=id)
         except Ticket.DoesNotExist:
             return render_error(request, 404, "Ticket does not exist")
@@ -366,7 +417,7 @@ def ticket_close(request, id):
         try:
             ticket = Ticket.objects.get(id=id)
             if request.user.id == ticket.owner.id or request.user.has_perm("ticketcontrol.change_ticket_status"):
-                ticket.set_status(str(Ticket.StatusChoices.CLOSED))
+                ticket.set_status(str(Ticket.StatusChoices.CLOSED), request.user.id)
             else:
                 return redirect("login")
             return redirect("dashboard")
@@ -417,12 +468,12 @@ def ticket_info_update(request, id):
     if request.method == "POST":
         try:
             ticket = Ticket.objects.get(id=id)
-            if request.user.id == ticket.owner.id or request.user.has_perm("ticketcontrol.change_ticket"):
+            if access_control(request).can_change_ticket(ticket.id):
                 try:
                     if request.POST['title'] != "" and not None:
                         ticket.title = request.POST['title']
-                    if settings.GENERAL["allow_location"]:
-                        if (request.POST['location'] != "" and not None) or not settings.GENERAL["force_location"]:
+                    if system_settings.general()["allow_location"]:
+                        if (request.POST['location'] != "" and not None) or not system_settings.general()["force_location"]:
                             ticket.location = request.POST['location']
                     if not request.POST['category'] in (0, "", "0", None):
                         ticket.category = Category.objects.get(id=request.POST['category'])
@@ -466,64 +517,53 @@ def attachment_access_control(request, id, name=None):
     if name is None:
         name = str(id)
     try:
-        attachment = Attachment.objects.get(id=id)
+        attachment = Attachment.objects.select_related("blob").get(id=id)
     except Attachment.DoesNotExist:
         return render_error(request, 404, "Attachment does not exist")
-    authorized = False
-    if request.user.id == attachment.user.id:
-        authorized = True
-    elif attachment.ticket is not None and request.user.id == attachment.ticket.owner.id:
-        authorized = True
-    elif attachment.comment is not None and request.user.id == attachment.comment.user.id:
-        authorized = True
-    elif request.user.has_perm("ticketcontrol.view_attachment"):
-        authorized = True
-    else:
-        for participant in attachment.ticket.participating.all():
-            if request.user.id == participant.id:
-                authorized = True
-        if not authorized:
-            for moderator in attachment.ticket.moderators.all():
-                if request.user.id == moderator.id:
-                    authorized = True
-    if authorized:
+    if access_control(request).can_view_attachment(attachment.id):
         if not settings.DEBUG:
             response = HttpResponse()
             # Content-type will be detected by nginx
             del response['Content-Type']
-            response['X-Accel-Redirect'] = '/serve_attachment/' + str(id)
+            response['X-Accel-Redirect'] = '/serve_attachment/' + attachment_name(attachment)
             response['Content-Disposition'] = 'attachment;filename="' + name + '"'
             return response
         else:
-            response = serve(request, str(id), document_root="uploads")
+            response = serve(request, attachment_name(attachment), document_root=UPLOAD_DIR)
             response['Content-Disposition'] = 'attachment;filename="' + name + '"'
             return response
     else:
         return render_error(request, 403)
 
 
+def attach_upload(request, attachment, ticket_id=None, comment_id=None):
+    if ticket_id:
+        ticket = Ticket.objects.get(id=ticket_id)
+        if request.user.id == ticket.owner_id or request.user.has_perm("ticketcontrol.add_attachment"):
+            attachment.ticket = ticket
+    elif comment_id:
+        comment = Comment.objects.get(id=comment_id)
+        if request.user.id == comment.user_id or request.user.has_perm("ticketcontrol.add_attachment"):
+            attachment.comment = comment
+
+
 @login_required()
 def attachment_upload(request):
     if request.method == "POST":
         try:
             file = request.FILES['attachment']
-            attachment = Attachment.objects.create(filename=file.name, size=file.size, ticket=None, comment=None,
-                                                   user=User.objects.get(id=request.user.id))
-            with open("uploads/" + str(attachment.id), "wb+") as destination:
-                for chunk in file.chunks():
-                    destination.write(chunk)
-            if request.POST.get("ticket"):
-                ticket = Ticket.objects.get(id=request.POST['ticket'])
-                if request.user.id == ticket.owner.id or request.user.has_perm("ticketcontrol.add_attachment"):
-                    attachment.ticket = ticket
-            elif request.POST.get("comment"):
-                comment = Comment.objects.get(id=request.POST['comment'])
-                if request.user.id == comment.user.id or request.user.has_perm("ticketcontrol.add_attachment"):
-                    attachment.comment = comment
-            attachment.save()
+            os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+            path = partial_upload_path(uuid.uuid4())
+            file_hash = save_uploaded_file(file, path)
+            with transaction.atomic():
+                attachment = Attachment(filename=file.name, size=file.size, ticket=None, comment=None,
+                                        user=request.user)
+                attach_upload(request, attachment, request.POST.get("ticket"), request.POST.get("comment"))
+                attachment.blob = add_blob_reference(file_hash, file.size, path)
+                attachment.save()
             return HttpResponse(str(attachment.id))
-        except User.DoesNotExist:
-            return render_error(request, 404, "User does not exist")
+        except ValueError:
+            return render_error(request, 400, "Invalid ticket or comment id")
         except Ticket.DoesNotExist:
             return render_error(request, 404, "Ticket does not exist")
         except Comment.DoesNotExist:
@@ -536,6 +576,121 @@ def attachment_upload(request):
     return render_error(request, 405, "This site is only available for post requests")
 
 
+def upload_state(upload):
+    return {"id": str(upload.id), "offset": upload.offset, "size": upload.size, "chunk_size": upload.chunk_size}
+
+
+@login_required()
+def attachment_upload_init(request):
+    """Start a resumable upload, the file is then sent in chunks and finalized into an attachment."""
+    if request.method != "POST":
+        return render_error(request, 405, "This site is only available for post requests")
+    try:
+        size = int(request.POST['size'])
+    except (KeyError, ValueError):
+        return render_error(request, 400, "The size of the file is missing")
+    if size < 0:
+        return render_error(request, 400, "Invalid file size")
+    if size > settings.UPLOAD_MAX_SIZE:
+        return render_error(request, 413, "The file is larger than " + str(settings.UPLOAD_MAX_SIZE) + " bytes")
+    ticket_id = request.POST.get("ticket") or None
+    comment_id = request.POST.get("comment") or None
+    # checked now instead of on finalize, before the client sends any chunk
+    target = Attachment(user_id=request.user.id)
+    try:
+        attach_upload(request, target, ticket_id, comment_id)
+    except ValueError:
+        return render_error(request, 400, "Invalid ticket or comment id")
+    except Ticket.DoesNotExist:
+        return render_error(request, 404, "Ticket does not exist")
+    except Comment.DoesNotExist:
+        return render_error(request, 404, "Comment does not exist")
+    if (ticket_id or comment_id) and target.ticket_id is None and target.comment_id is None:
+        return render_error(request, 403, "You aren't allowed to add attachments to this ticket or comment")
+    try:
+        upload = Upload.objects.create(filename=request.POST['filename'], size=size,
+                                       chunk_size=settings.UPLOAD_CHUNK_SIZE, user_id=request.user.id,
+                                       ticket_id=target.ticket_id, comment_id=target.comment_id)
+        os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+        open(partial_upload_path(upload.id), "wb").close()
+    except KeyError:
+        return render_error(request, 400, "The name of the file is missing")
+    except PermissionError:
+        return render_error(request, 403, "Unable to save attachment")
+    except DataError:
+        return render_error(request, 400,
+                            "DataError: invalid data supplied (maybe too many characters in one field)")
+    return JsonResponse(upload_state(upload))
+
+
+@login_required()
+def attachment_upload_chunk(request, id):
+    """GET returns the state of the upload, PUT ?offset=<offset> writes the request body at that offset.
+
+    Every chunk except the last one must be exactly chunk_size bytes long. An offset other than the number of
+    bytes received so far is answered with 409 and the current state, from which the client resumes.
+    """
+    if request.method not in ("GET", "PUT"):
+        return render_error(request, 405, "This site is only available for GET and PUT requests")
+    with transaction.atomic():
+        try:
+            # the lock serializes chunks sent twice, e.g. when a client retries after a timeout
+            upload = Upload.objects.select_for_update().get(id=id, user=request.user.id)
+        except Upload.DoesNotExist:
+            return render_error(request, 404, "Upload does not exist")
+        if request.method == "GET":
+            return JsonResponse(upload_state(upload))
+        try:
+            offset = int(request.GET['offset'])
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (KeyError, ValueError):
+            return render_error(request, 400, "The offset of the chunk is missing")
+        if offset != upload.offset:
+            return JsonResponse(upload_state(upload), status=409)
+        end = offset + length
+        if length <= 0 or end > upload.size or (length != upload.chunk_size and end != upload.size):
+            return render_error(request, 400, "Invalid chunk size")
+        try:
+            digest = write_chunk(partial_upload_path(upload.id), offset, request, length)
+        except IncompleteChunk:
+            return render_error(request, 400, "The chunk is incomplete")
+        except FileNotFoundError:
+            return render_error(request, 410, "The upload expired")
+        upload.offset = end
+        upload.chunk_digests += digest
+        upload.save()
+    return JsonResponse(upload_state(upload))
+
+
+@login_required()
+def attachment_upload_finalize(request, id):
+    if request.method != "POST":
+        return render_error(request, 405, "This site is only available for post requests")
+    try:
+        with transaction.atomic():
+            try:
+                upload = Upload.objects.select_for_update().get(id=id, user=request.user.id)
+            except Upload.DoesNotExist:
+                return render_error(request, 404, "Upload does not exist")
+            if upload.offset != upload.size:
+                return JsonResponse(upload_state(upload), status=409)
+            digests = [upload.chunk_digests[i:i + 64] for i in range(0, len(upload.chunk_digests), 64)]
+            attachment = Attachment(filename=upload.filename, size=upload.size, user_id=request.user.id)
+            attach_upload(request, attachment, upload.ticket_id, upload.comment_id)
+            attachment.blob = add_blob_reference(content_hash(digests), upload.size, partial_upload_path(upload.id))
+            attachment.save()
+            upload.delete()
+    except Ticket.DoesNotExist:
+        return render_error(request, 404, "Ticket does not exist")
+    except Comment.DoesNotExist:
+        return render_error(request, 404, "Comment does not exist")
+    except FileNotFoundError:
+        return render_error(request, 410, "The upload expired")
+    except PermissionError:
+        return render_error(request, 403, "Unable to save attachment")
+    return HttpResponse(str(attachment.id))
+
+
 @login_required()
 def attachment_edit(request, id):
     if request.method == "POST":
@@ -543,21 +698,9 @@ def attachment_edit(request, id):
             attachment = Attachment.objects.get(id=id)
         except Attachment.DoesNotExist:
             return render_error(request, 404, "Attachment does not exist")
-        authorized = False
-        if request.user.id == attachment.user.id or request.user.has_perm("ticketcontrol.delete_attachment"):
-            authorized = True
-        elif attachment.ticket is not None and request.user.id == attachment.ticket.owner.id:
-            authorized = True
-        elif attachment.comment is not None and request.user.id == attachment.comment.user.id:
-            authorized = True
-        if authorized:
-            try:
-                os.remove("uploads/" + str(id))
-            except PermissionError:
-                return render_error(request, 403, "Unable to delete attachment")
-            except FileNotFoundError:
-                return render_error(request, 404, "Unable to delete attachment: File not found")
-            attachment.delete()
+        if access_control(request).can_delete_attachment(attachment.id):
+            with transaction.atomic():
+                delete_attachments(Attachment.objects.filter(id=attachment.id))
             return HttpResponse(status=200)
         else:
             return render_error(request, 403, "You aren't allowed to delete this attachment")
@@ -565,14 +708,9 @@ def attachment_edit(request, id):
 
 
 def username_check(username, old_username=None):
-    if User.objects.filter(username=username).exists():
-        i = 1
-        while User.objects.filter(username=username + str(i)).exists() and username + str(
-                i) != old_username and i < 200:
-            i += 1
-        if User.objects.filter(username=username + str(i)).exists() and username + str(i) != old_username:
-            return {"status": 406}
-        return {"status": 409, "username": username + str(i)}
+    free = free_username(username, old_username)
+    if free != username:
+        return {"status": 409, "username": free}
     return {"status": 200}
 
 
@@ -585,12 +723,10 @@ def username_check_view(request, username):
 
 
 @login_required()
-def username_live_search(request, typed_username):
-    some_users = User.objects.filter(username__contains=typed_username)[:10]
+def user_autocomplete(request):
     res = []
-    for user in some_users:
-        newUser = {"username": user.username, "first_name": user.first_name, "last_name": user.last_name, "id": user.id}
-        res.append(newUser)
+    for user_id, username, first_name, last_name in user_index.search(request.GET.get("q", "")):
+        res.append({"username": username, "first_name": first_name, "last_name": last_name, "id": user_id})
     return JsonResponse(res, safe=False)  # It's ok. Disables typecheck for dict. Make sure to only pass an array
 
 
@@ -607,6 +743,10 @@ def login_view(request):
     if request.method == 'POST':
         username = str(request.POST['username'])
         password = request.POST['password']
+        if not throttle.login_allowed(request, username):
+            return render(request, "user/login.html",
+                          {"error": "Zu viele Anmeldeversuche, bitte später erneut versuchen.", "next": next,
+                           "half_page": system_settings.content()["half_page"]}, status=429)
         try:
             validate_email(username)
             try:
@@ -632,7 +772,7 @@ def login_view(request):
     if request.user.is_authenticated:
         return redirect("dashboard")
     return render(request, "user/login.html",
-                  {"error": error, "next": next, "half_page": settings.CONTENT["half_page"]})
+                  {"error": error, "next": next, "half_page": system_settings.content()["half_page"]})
 
 
 def register_view(request):
@@ -645,22 +785,19 @@ def register_view(request):
             email = request.POST['email']
             firstname = request.POST['firstname']
             lastname = request.POST['lastname']
-            if settings.REGISTER["allow_custom_username"] and "username" in request.POST:
+            if system_settings.register()["allow_custom_username"] and "username" in request.POST:
                 username = request.POST['username']
-            elif settings.REGISTER["use_email_prefix_as_username"]:
+            elif system_settings.register()["use_email_prefix_as_username"]:
                 username = email.split("@")[0]
             else:
                 username = firstname[0:1] + "." + lastname.replace(" ", "-")
-            res = username_check(username)
-            if res["status"] == 409:
-                username = res["username"]
 
-            if not User.objects.filter(email=email).exists() and not res["status"] == 406:
+            if not User.objects.filter(email=email).exists():
                 email_authorized = False
-                if not settings.REGISTER['email_whitelist_enable']:
+                if not system_settings.register()['email_whitelist_enable']:
                     email_authorized = True
                 else:
-                    for whitelist_entry in settings.REGISTER['email_whitelist']:
+                    for whitelist_entry in system_settings.register()['email_whitelist']:
                         if whitelist_entry.startswith("@"):
                             whitelist_entry = ".*" + whitelist_entry
                         if re.fullmatch(whitelist_entry, email) is not None:
@@ -668,30 +805,26 @@ def register_view(request):
                             break
                 if email_authorized:
                     try:
-                        user = User.add_user(None, firstname, lastname, username, password, groups=None, is_active=True,
-                                             email_confirmed=False)
+                        user = create_with_free_username(username, lambda free: User.add_user(
+                            None, firstname, lastname, free, password, groups=None, is_active=True,
+                            email_confirmed=False))
                         user.new_email = request.POST['email']
                         user.save()
                     except DataError:
                         return render_error(request, 400,
                                             "DataError: invalid data supplied (maybe too many characters in one field)")
-                    try:
-                        User.send_emailverification_mail(user, request)
-                    except SMTPRecipientsRefused:
-                        return render_error(request, 500, "Unable to send verification email")
-                    except ConnectionRefusedError:
-                        return render_error(request, 500, "Unable to connect to E-Mail server")
+                    User.send_emailverification_mail(user, request)
                     return render(request, "user/activate.html",
-                                  {'action': 'activate', "half_page": settings.CONTENT["half_page"]})
+                                  {'action': 'activate', "half_page": system_settings.content()["half_page"]})
                 else:
                     return render_error(request, 406, "Your E-Mail address is not white-listed")
             else:
                 return render_error(request, 409, "Username or email already exists")
         else:
             return render_error(request, 409, "Passwords do not match")
-    return render(request, "user/register.html", {"half_page": settings.CONTENT["half_page"],
-                                                  "allow_custom_username": settings.REGISTER["allow_custom_username"],
-                                                  "use_email_prefix_as_username": settings.REGISTER[
+    return render(request, "user/register.html", {"half_page": system_settings.content()["half_page"],
+                                                  "allow_custom_username": system_settings.register()["allow_custom_username"],
+                                                  "use_email_prefix_as_username": system_settings.register()[
                                                       "use_email_prefix_as_username"]})
 
 
@@ -708,31 +841,28 @@ def user_create_view(request):
         firstname = request.POST['firstname']
         lastname = request.POST['lastname']
         username = None
-        if settings.REGISTER["allow_custom_username"] and "username" in request.POST:
+        if system_settings.register()["allow_custom_username"] and "username" in request.POST:
             username = request.POST['username']
-        elif settings.REGISTER["use_email_prefix_as_username"]:
+        elif system_settings.register()["use_email_prefix_as_username"]:
             username = email.split("@")[0]
         else:
             username = firstname[0:1] + "." + lastname.replace(" ", "-")
-        res = username_check(username)
-        if res["status"] == 409:
-            username = res["username"]
 
-        if not User.objects.filter(email=email).exists() and not res["status"] == 406:
+        if not User.objects.filter(email=email).exists():
             try:
-                User.add_user(request.POST['email'], firstname, lastname,
-                              username, password, groups, request.POST.get("is_active", False) == "on",
-                              email_confirmed=True)
+                create_with_free_username(username, lambda free: User.add_user(
+                    request.POST['email'], firstname, lastname, free, password, groups,
+                    request.POST.get("is_active", False) == "on", email_confirmed=True))
                 return redirect("manage_users")
             except DataError:
                 return render_error(request, 400,
                                     "DataError: invalid data supplied (maybe too many characters in one field)")
         else:
             return render_error(request, 409, "Username or E-Mail already exists")
-    return render(request, "user/create.html", {"groups": Group.objects.all(),
+    return render(request, "user/create.html", {"groups": reference.groups.all(),
                                                 "can_change_permission": request.user.has_perm(
                                                     "ticketcontrol.change_user_permission"),
-                                                "use_email_prefix_as_username": settings.REGISTER[
+                                                "use_email_prefix_as_username": system_settings.register()[
                                                     "use_email_prefix_as_username"]})
 
 
@@ -762,7 +892,7 @@ def user_activate_view(request):
     except User.DoesNotExist:
         return render_error(request, 404, "User does not exist")
     return render(request, "user/activate.html",
-                  {"content_user": user, "token": request.GET['token'], "half_page": settings.CONTENT["half_page"]})
+                  {"content_user": user, "token": request.GET['token'], "half_page": system_settings.content()["half_page"]})
 
 
 def user_passwordreset_view(request):
@@ -786,12 +916,14 @@ def user_passwordreset_view(request):
     except User.DoesNotExist:
         return render_error(request, 404, "User does not exist")
     return render(request, "user/passwordreset.html",
-                  {"content_user": user, "token": request.GET['token'], "half_page": settings.CONTENT["half_page"]})
+                  {"content_user": user, "token": request.GET['token'], "half_page": system_settings.content()["half_page"]})
 
 
 def user_passwordreset_request_view(request):
     if request.method == "POST":
         username = request.POST['username']
+        if not throttle.password_reset_allowed(request, username):
+            return render_error(request, 429, "Too many password reset requests, try again later")
         try:
             try:
                 validate_email(username)
@@ -800,15 +932,10 @@ def user_passwordreset_request_view(request):
                 user = User.objects.get(username=username)
         except User.DoesNotExist:
             return render_error(request, 404, "User does not exist")
-        try:
-            user.send_passwordreset_mail(request)
-        except SMTPRecipientsRefused:
-            return render_error(request, 500, "Unable to send verification email")
-        except ConnectionRefusedError:
-            return render_error(request, 500, "Unable to connect to E-Mail server")
+        user.send_passwordreset_mail(request)
         return render(request, "user/passwordreset_request.html",
-                      {"sent_email": True, "half_page": settings.CONTENT["half_page"]})
-    return render(request, "user/passwordreset_request.html", {"half_page": settings.CONTENT["half_page"]})
+                      {"sent_email": True, "half_page": system_settings.content()["half_page"]})
+    return render(request, "user/passwordreset_request.html", {"half_page": system_settings.content()["half_page"]})
 
 
 @permission_required("ticketcontrol.view_user")
@@ -841,17 +968,6 @@ def user_details_view(request, id):
     return redirect("login")
 
 
-@login_required()
-def user_live_search(request, typed_username):
-    users = User.objects.filter(username__contains=typed_username)[:10]
-    res = []
-    for user in users:
-        new_user = {"username": user.username, "first_name": user.first_name, "last_name": user.last_name,
-                    "id": user.id}
-        res.append(new_user)
-    return JsonResponse(res, safe=False)  # It's ok. Disables typecheck for dict. Make sure to only pass an array
-
-
 @login_required()
 def user_edit_view(request, id):
     if request.user.has_perm("ticketcontrol.change_user") or request.user.id == id:
@@ -869,14 +985,12 @@ def user_edit_view(request, id):
             if user.username == "ghost":
                 return render_error(request, 403, "Editing the user ghost is not allowed")
             username = None
-            if settings.REGISTER["allow_custom_username"]:
+            if system_settings.register()["allow_custom_username"]:
                 username = request.POST['username']
                 if user.username != username:
                     res = username_check(username, user.username)
                     if res["status"] == 409:
                         username = res["username"]
-                    if res["status"] == 406:
-                        return render_error(request, 406, "Unable to get unused username")
             try:
                 user.update_user(None, request.POST['firstname'], request.POST['lastname'],
                                  username, password, groups,
@@ -889,10 +1003,10 @@ def user_edit_view(request, id):
                             user.save()
                         else:
                             email_authorized = False
-                            if not settings.REGISTER['email_whitelist_enable']:
+                            if not system_settings.register()['email_whitelist_enable']:
                                 email_authorized = True
                             else:
-                                for whitelist_entry in settings.REGISTER['email_whitelist']:
+                                for whitelist_entry in system_settings.register()['email_whitelist']:
                                     if whitelist_entry.startswith("@"):
                                         whitelist_entry = ".*" + whitelist_entry
                                     if re.fullmatch(whitelist_entry, email) is not None:
@@ -900,14 +1014,9 @@ def user_edit_view(request, id):
                                         break
                             if email_authorized:
                                 user.update_user(email=email)
-                                try:
-                                    user.send_emailverification_mail(request)
-                                except SMTPRecipientsRefused:
-                                    return render_error(request, 500, "Unable to send verification email")
-                                except ConnectionRefusedError:
-                                    return render_error(request, 500, "Unable to connect to E-Mail server")
+                                user.send_emailverification_mail(request)
                                 return render(request, "user/activate.html",
-                                              {"half_page": settings.CONTENT["half_page"]})
+                                              {"half_page": system_settings.content()["half_page"]})
                             else:
                                 return render_error(request, 406, "Your E-Mail address is not white-listed")
                     else:
@@ -927,7 +1036,7 @@ def user_edit_view(request, id):
         if user.username == "ghost":
             return render_error(request, 403, "Editing user ghost is not allowed")
         return render(request, "user/edit.html",
-                      {"content_user": user, "userGroups": groups, "groups": Group.objects.all(),
+                      {"content_user": user, "userGroups": groups, "groups": reference.groups.all(),
                        "can_change_permission": request.user.has_perm(
                            "ticketcontrol.change_user_permission"),
                        "can_change": True,
@@ -960,7 +1069,7 @@ def user_delete_view(request, id):
 @permission_required("auth.view_group")
 def group_manage_view(request):
     return render(request, "user/group/manage.html",
-                  {"groups": Group.objects.all().order_by("id"),
+                  {"groups": reference.groups.all(),
                    "can_create": request.user.has_perm("ticketcontrol.create_user")})
 
 
@@ -970,7 +1079,7 @@ def group_create_view(request):
         try:
             group = Group.objects.create(name=request.POST['name'])
             permissions = request.POST.getlist("permissions")
-            all_permissions = Permission.objects.all()
+            all_permissions = reference.permissions.all()
             for permission in permissions:
                 in_all_permissions = False
                 for perm in all_permissions:
@@ -985,7 +1094,7 @@ def group_create_view(request):
             return render_error(request, 400,
                                 "DataError: invalid data supplied (maybe too many characters in one field)")
         permissions = request.POST.getlist("permissions")
-        all_permissions = Permission.objects.all()
+        all_permissions = reference.permissions.all()
         for permission in permissions:
             for perm in all_permissions:
                 if int(perm.perm.id) == int(permission):
@@ -997,8 +1106,8 @@ def group_create_view(request):
         group.save()
         return redirect("manage_groups")
     return render(request, "user/group/create.html",
-                  {"permissions": Permission.objects.all(), "categories": Category.objects.all(),
-                   "half_page": settings.CONTENT["half_page"]})
+                  {"permissions": reference.permissions.all(), "categories": reference.categories.all(),
+                   "half_page": system_settings.content()["half_page"]})
 
 
 @permission_required("auth.view_group")
@@ -1015,7 +1124,7 @@ def group_edit_view(request, id):
             if group.name != "admin":  # admin is superuser anyway
                 group_permissions = group.permissions.all()
                 permissions = request.POST.getlist("permissions")
-                all_permissions = Permission.objects.all()
+                all_permissions = reference.permissions.all()
                 for permission in group_permissions:
                     if not permission.id in permissions:
                         group.permissions.remove(permission.id)
@@ -1061,11 +1170,11 @@ def group_edit_view(request, id):
     for categoryId in group.categories.all().values_list("id", flat=True):
         group_categories.append(categoryId)
     return render(request, "user/group/edit.html",
-                  {"group": group, "group_permissions": group_permissions, "permissions": Permission.objects.all(),
-                   "group_categories": group_categories, "categories": Category.objects.all(),
+                  {"group": group, "group_permissions": group_permissions, "permissions": reference.permissions.all(),
+                   "group_categories": group_categories, "categories": reference.categories.all(),
                    "can_change": can_edit, "can_delete": request.user.has_perm(
                       "ticketcontrol.delete_group") and group.name != "admin" and group.name != "moderator" and group.name != "user",
-                   "half_page": settings.CONTENT["half_page"]})
+                   "half_page": system_settings.content()["half_page"]})
 
 
 @permission_required("auth.delete_group")
@@ -1079,18 +1188,12 @@ def group_delete_view(request, id):
     if request.method == 'POST':
         group.delete()
         return redirect("manage_groups")
+    return render_error(request, 405, "This site is only available for POST requests")
 
 
 def settings_view(request):
     if request.user.is_superuser:
-        try:
-            settings_file = open("settings/settings.json")
-            settings_json = json.load(settings_file)
-            settings_file.close()
-        except FileNotFoundError:
-            return render_error(request, 404, "The settings file does not exist")
-        except PermissionError:
-            return render_error(request, 403, "Unable to open settings file")
+        settings_json = copy.deepcopy(system_settings.store.load())
         if request.method == "POST":
             general = settings_json['general']
             general['contact_email'] = request.POST['general.contact-email']
@@ -1123,16 +1226,7 @@ def settings_view(request):
             for entry in request.POST.getlist('register.email-whitelist'):
                 register['email_whitelist'].append(entry)
 
-            try:
-                settings_file = open("settings/settings.json", "w+")
-                json.dump(settings_json, settings_file)
-                settings_file.close()
-            except PermissionError:
-                return render_error(request, 403, "Unable to save settings file")
-
-            if request.POST.get('restart-container', False) == "on":
-                with open("/etc/hostname", "r") as hostname:
-                    os.system("docker restart " + hostname.read())
+            system_settings.store.save(settings_json)
             return HttpResponse(status=200)
         else:
             return render(request, "settings.html", {"settings": settings_json})
@@ -1154,7 +1248,7 @@ def category_create_view(request):
                                 "DataError: invalid data supplied (maybe too many characters in one field)")
         return redirect("manage_categories")
     else:
-        groups = Group.objects.all()
+        groups = reference.groups.all()
         return render(request, "category/create.html", {"groups": groups})
 
 
@@ -1191,7 +1285,7 @@ def category_edit_view(request, id):
             return redirect("manage_categories")
         else:
             return redirect("login")
-    groups = Group.objects.all()
+    groups = reference.groups.all()
     selected_groups = []
     for group in category.groups.all():
         selected_groups.append(group.id)
@@ -1217,13 +1311,13 @@ def category_delete_view(request, id):
 @permission_required("ticketcontrol.view_category")
 def category_manage_view(request):
     return render(request, "category/manage.html",
-                  {"categories": Category.objects.all(),
+                  {"categories": reference.categories.all(),
                    "can_create": request.user.has_perm("ticketcontrol.create_category")})
 
 
 def imprint_view(request):
-    return render(request, "imprint.html", {"imprint": settings.CONTENT["imprint"]})
+    return render(request, "imprint.html", {"imprint": system_settings.content()["imprint"]})
 
 
 def privacy_view(request):
-    return render(request, "privacy.html", {"privacy": settings.CONTENT["privacy"]})
+    return render(request, "privacy.html", {"privacy": system_settings.content()["privacy"]})
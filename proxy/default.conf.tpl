@@ -11,6 +11,20 @@ server {
         alias /uploads/;
     }
 
+    # links handed out by ticketcontrol.files.attachment_url, checked here without asking the app
+    location /signed_attachment/ {
+        secure_link             $arg_md5,$arg_expires;
+        secure_link_md5         "$secure_link_expires$uri$arg_user ${ATTACHMENT_URL_SECRET}";
+        if ($secure_link = "") {
+            return 403;
+        }
+        if ($secure_link = "0") {
+            return 410;
+        }
+        add_header              Content-Disposition "attachment; filename*=UTF-8''$arg_name";
+        alias /uploads/;
+    }
+
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
@@ -2,5 +2,10 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+# without a shared secret the app does not sign links, a random one keeps /signed_attachment closed
+export ATTACHMENT_URL_SECRET="${ATTACHMENT_URL_SECRET:-$(head -c 32 /dev/urandom | base64)}"
+
+# only substitute our variables, the nginx variables ($uri, $arg_...) must stay
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT} ${MAX_REQUEST_SIZE} ${ATTACHMENT_URL_SECRET}' \
+  < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
 nginx -g "daemon off;"
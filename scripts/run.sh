@@ -13,4 +13,13 @@ python manage.py collectstatic --noinput
 python manage.py migrate
 
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module ticketcontrol.wsgi
+# the master runs the queued file removals and notification digests outside of the request handling workers,
+# once per minute, looks for orphaned uploads and deletes expired sessions and throttle counters once per hour and
+# keeps the mail sender running
+uwsgi --socket :9000 --workers 4 --master --enable-threads --module ticketcontrol.wsgi \
+  --attach-daemon "python manage.py send_queued_emails --forever" \
+  --unique-cron "-1 -1 -1 -1 -1 python manage.py remove_scheduled_files" \
+  --unique-cron "-1 -1 -1 -1 -1 python manage.py send_notification_digests" \
+  --unique-cron "17 -1 -1 -1 -1 python manage.py collect_orphaned_uploads" \
+  --unique-cron "43 -1 -1 -1 -1 python manage.py clearsessions" \
+  --unique-cron "47 -1 -1 -1 -1 python manage.py clear_throttle_counters"